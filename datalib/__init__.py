@@ -1,15 +1,51 @@
+from datalib.caching import *
 from datalib.correlation import *
+from datalib.dataset import *
 from datalib.discretization import *
 from datalib.feature_scaling import *
 from datalib.filtering import *
 from datalib.metrics import *
-from datalib.plotting import *
+from datalib.resampling import *
+from datalib.sketches import *
+from datalib import profiling
+
+import importlib as _importlib
+import types as _types
+
+# Submodules with heavy dependencies (matplotlib) are imported on the first access to them or to one of their functions
+_lazy_modules = {"plotting": ["plot_ROC", "plot_CM", "plot_entropy", "downsample_curve", "render_batch"]}
+_lazy_names = {name: module for module, names in _lazy_modules.items() for name in [module] + names}
+
+def __getattr__(name):
+    if name not in _lazy_names:
+        raise AttributeError(f"module 'datalib' has no attribute '{name}'")
+    module = _importlib.import_module(f"datalib.{_lazy_names[name]}")
+    globals()[_lazy_names[name]] = module
+    for attr in _lazy_modules[_lazy_names[name]]:
+        globals()[attr] = getattr(module, attr)
+    return(globals()[name])
+
+def __dir__():
+    return(sorted(set(globals()) | set(_lazy_names)))
+
+def _is_public(name, value):
+    """Functions, classes and constants of datalib, without the modules and the names that the submodules import from other packages."""
+    if name.startswith("_") or isinstance(value, _types.ModuleType):
+        return(False)
+    return(not callable(value) or getattr(value, "__module__", "").startswith("datalib"))
+
+__all__ = [name for name, value in list(globals().items()) if _is_public(name, value)] + [name for name in _lazy_names if name not in _lazy_modules]
 
 """
+from datalib import caching
 from datalib import correlation
+from datalib import dataset
 from datalib import discretization
 from datalib import feature_scaling
 from datalib import filtering
 from datalib import metrics
 from datalib import plotting
-"""
\ No newline at end of file
+from datalib import resampling
+from datalib import sketches
+from datalib import profiling
+"""
@@ -0,0 +1,233 @@
+"""
+Benchmark suite of the public functions of datalib.
+
+Run it from the command line:
+
+    python -m datalib.benchmark --output bench.json
+    python -m datalib.benchmark --baseline bench.json --threshold 0.25
+
+The first command records the time and the peak memory of every case for each size of the sweep, and of importing datalib in a new interpreter. The 
+second one runs the suite again and exits with status 1 if any case is slower or uses more memory than in the baseline by more than the threshold.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from datalib import correlation, discretization, feature_scaling, filtering, metrics
+
+ROWS = [10**3, 10**4, 10**5, 10**6, 10**7]
+COLS = [10, 100, 1000, 10000]
+
+def make_continuous(n_rows, n_cols, seed=0):
+    """Dataframe of n_rows x n_cols normal float values, with some correlated columns."""
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_rows, n_cols))
+    x[:, 1::2] += x[:, ::2][:, :n_cols//2] # pairs of correlated columns
+    return(pd.DataFrame(x, columns=[f"Var{i+1}" for i in range(n_cols)]))
+
+def make_categorical(n_rows, n_cols, n_levels=10, seed=0):
+    """Dataframe of n_rows x n_cols string values, each column with up to n_levels levels."""
+    rng = np.random.default_rng(seed)
+    levels = np.array([f"l{i}" for i in range(n_levels)], dtype=object)
+    return(pd.DataFrame(levels[rng.integers(0, n_levels, (n_rows, n_cols))], columns=[f"Var{i+1}" for i in range(n_cols)]))
+
+def make_classification(n_rows, seed=0):
+    """Dataframe with a column of predicted probabilities and a column of boolean labels that depend on them."""
+    rng = np.random.default_rng(seed)
+    y = rng.random(n_rows)
+    return(pd.DataFrame({"y": y, "lab": rng.random(n_rows) < y}))
+
+def make_mixed(n_rows, n_cols, seed=0):
+    """Dataframe with float, integer and string columns."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(n_cols):
+        if i % 3 == 0:
+            data[f"Var{i+1}"] = rng.standard_normal(n_rows)
+        elif i % 3 == 1:
+            data[f"Var{i+1}"] = rng.integers(0, 20, n_rows)
+        else:
+            data[f"Var{i+1}"] = np.array(["a", "b", "c", "d"], dtype=object)[rng.integers(0, 4, n_rows)]
+    return(pd.DataFrame(data))
+
+correlation_module = sys.modules["datalib.correlation"] # the package attribute is the correlation function
+
+# name: (generator(n_rows, n_cols), function(data), whether the sweep of columns applies, exponent of the columns in the cost)
+CASES = {
+    "AUC": (lambda n, c: make_classification(n), metrics.AUC, False, 1),
+    "calc_metrics_continuous": (make_continuous, metrics.calc_metrics, True, 1),
+    "calc_metrics_mixed": (make_mixed, metrics.calc_metrics, True, 1),
+    "correlation_continuous": (make_continuous, correlation, True, 2),
+    "correlation_categorical": (make_categorical, correlation, True, 2),
+    "mutual_info": (lambda n, c: make_categorical(n, 2), lambda d: correlation_module.mutual_info(d.iloc[:, 0], d.iloc[:, 1]), False, 1),
+    "discretize_EW": (make_continuous, lambda d: discretization.discretize(d, 10, "EW"), True, 1),
+    "discretize_EF": (make_continuous, lambda d: discretization.discretize(d, 10, "EF"), True, 1),
+    "feature_scaling": (make_continuous, lambda d: feature_scaling(d, "satandarize"), True, 1),
+    "filter_condition_list": (make_continuous, lambda d: filtering.filter_condition_list(d, ["Var1 > 0", "Var2 < 1 | Var1 > 2", "Var2 <= 0, 0"]), True, 1),
+}
+
+# name: module imported in a new interpreter
+IMPORT_CASES = {
+    "import_datalib": "datalib",
+}
+
+_IMPORT_SCRIPT = """
+import sys, time, tracemalloc
+if sys.argv[1] == "trace":
+    tracemalloc.start()
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(seconds, tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0)
+"""
+
+def measure_import(module="datalib", repeat=1):
+    """
+    Measures the best wall time and the peak of memory allocated by importing a module in a new Python interpreter, so nothing is imported yet.
+    
+    Parameters
+    ----------
+    module (str): Name of the module. By default "datalib".
+    repeat (int): Number of timed imports, each one in a new interpreter. The fastest one is kept. By default 1.
+    
+    Returns
+    -------
+    seconds (float): Wall time of the fastest import.
+    peak_bytes (int): Peak of memory allocated during the import, traced with tracemalloc in a separate interpreter.
+    """
+    def run_import(mode):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(module=module), mode], capture_output=True, text=True, check=True).stdout
+        seconds, peak = out.split()
+        return(float(seconds), int(peak))
+    
+    peak = run_import("trace")[1]
+    return(min(run_import("time")[0] for i in range(repeat)), peak)
+
+def measure(function, data, repeat=1):
+    """
+    Measures the best wall time and the peak of memory allocated by a call of function(data).
+
+    Parameters
+    ----------
+    function (callable): Function to measure.
+    data: Argument of the function.
+    repeat (int): Number of calls. The fastest one is kept. By default 1.
+
+    Returns
+    -------
+    seconds (float): Wall time of the fastest call.
+    peak_bytes (int): Peak of memory allocated during the first call, traced with tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        function(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        times.append(time.perf_counter() - start)
+    return(min(times), peak)
+
+def run(cases=None, rows=ROWS, cols=COLS, max_cells=10**8, repeat=1, verbose=False):
+    """
+    Runs the benchmark cases for every number of rows and columns of the sweep.
+
+    Parameters
+    ----------
+    cases (list, optional): Names of the cases to run (see CASES and IMPORT_CASES). By default all of them.
+    rows (list): Numbers of rows of the sweep.
+    cols (list): Numbers of columns of the sweep. Cases that use a fixed number of columns only run once per number of rows.
+    max_cells (int): Sizes with more cells are skipped. For the pairwise cases the cells are rows x columns^2. By default 10**8.
+    repeat (int): Number of timed calls of each case, the fastest one is kept. By default 1.
+    verbose (bool): If True each result is printed as soon as it is measured.
+
+    Returns
+    -------
+    dict: The results, with the versions of the environment, ready to be saved as JSON.
+    """
+    results = []
+    for name in cases or list(CASES) + list(IMPORT_CASES):
+        if name in IMPORT_CASES:
+            seconds, peak = measure_import(IMPORT_CASES[name], repeat)
+            results.append({"case": name, "rows": None, "cols": None, "seconds": seconds, "peak_bytes": peak})
+            if verbose:
+                print(f"{name:28s} {'-':>9} x {'-':>6} {seconds:10.4f} s {peak/2**20:10.1f} MB")
+            continue
+        generator, function, uses_cols, cost = CASES[name]
+        for n_rows in rows:
+            for n_cols in (cols if uses_cols else [None]):
+                if n_rows*(n_cols or 1)**cost > max_cells:
+                    continue
+                data = generator(n_rows, n_cols)
+                seconds, peak = measure(function, data, repeat)
+                results.append({"case": name, "rows": n_rows, "cols": n_cols, "seconds": seconds, "peak_bytes": peak})
+                if verbose:
+                    print(f"{name:28s} {n_rows:>9d} x {n_cols or '-':>6} {seconds:10.4f} s {peak/2**20:10.1f} MB")
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__, "platform": platform.platform()}
+    return({"meta": meta, "results": results})
+
+def compare(current, baseline, threshold=0.2, min_seconds=0.01):
+    """
+    Compares the results of two runs and returns the regressions.
+
+    Parameters
+    ----------
+    current (dict): Results of run.
+    baseline (dict): Results of a previous run, for example loaded from a JSON file.
+    threshold (float): Maximum allowed relative increase of the time and the peak memory. By default 0.2 (20%).
+    min_seconds (float): Cases faster than this in the baseline are not checked for time, because the noise is larger than the threshold. By default 0.01.
+
+    Returns
+    -------
+    list: One dictionary per regression, with the case, the size, the metric, the baseline and the current values.
+    """
+    reference = {(r["case"], r["rows"], r["cols"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        base = reference.get((r["case"], r["rows"], r["cols"]))
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric == "seconds" and base[metric] < min_seconds:
+                continue
+            if r[metric] > base[metric]*(1+threshold):
+                regressions.append({"case": r["case"], "rows": r["rows"], "cols": r["cols"], "metric": metric, "baseline": base[metric], "current": r[metric]})
+    return(regressions)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m datalib.benchmark", description="Benchmark suite of the public functions of datalib.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES) + list(IMPORT_CASES), help="cases to run, by default all")
+    parser.add_argument("--rows", nargs="+", type=int, default=ROWS, help="numbers of rows of the sweep")
+    parser.add_argument("--cols", nargs="+", type=int, default=COLS, help="numbers of columns of the sweep")
+    parser.add_argument("--max-cells", type=float, default=1e8, help="skip sizes with more cells than this")
+    parser.add_argument("--repeat", type=int, default=1, help="timed calls per case, the fastest one is kept")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="maximum allowed relative regression, by default 0.2")
+    args = parser.parse_args(argv)
+
+    current = run(args.cases, args.rows, args.cols, args.max_cells, args.repeat, verbose=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} {r['rows']} x {r['cols']}: {r['metric']} {r['baseline']:.4g} -> {r['current']:.4g}")
+        if regressions:
+            return(1)
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
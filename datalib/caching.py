@@ -0,0 +1,409 @@
+"""
+Opt-in memoization of calc_metrics, correlation and discretize, keyed by the content of the columns.
+
+Every column is identified by a hash of its values, and the results are stored per column (metrics, cut points) or per pair of columns (correlations),
+together with the parameters of the call. When a table is analyzed again only the columns that changed, or the pairs that involve them, are calculated:
+
+    cache = ResultCache(directory="/tmp/datalib-cache", max_bytes=2**30)
+    cached_correlation(data, cache=cache)
+"""
+from datalib.utils import *
+from datalib import profiling
+from datalib.metrics import AUC, entropy, variance
+from datalib.discretization import cut_points_EF, cut_points_EW, discretize_generic
+from collections import OrderedDict
+import hashlib
+import importlib
+import numpy as np
+import pandas as pd
+import os
+import pickle
+
+_correlation = importlib.import_module("datalib.correlation") # the package attribute is the correlation function
+
+def _hasher(dtype):
+    h = hashlib.sha256() # hardware accelerated on most current CPUs, faster than blake2b there
+    h.update(str(dtype).encode())
+    return(h)
+
+def _numeric(values):
+    return(isinstance(values, np.ndarray) and values.dtype.kind in "biufcmM")
+
+def column_hash(x):
+    """
+    Calculates a hash of the values and the type of a column, which changes when any value changes.
+
+    Parameters
+    ----------
+    x (pandas.Series or numpy.array): The column.
+
+    Returns
+    -------
+    str: Hexadecimal digest of 32 characters.
+    """
+    h = _hasher(x.dtype)
+    values = x.to_numpy() if isinstance(x, pd.Series) and x.dtype.kind in "biufcmM" else x
+    if _numeric(values):
+        h.update(np.ascontiguousarray(values).view(np.uint8).data) # the buffer itself, without copies if it is contiguous
+    else: # objects, strings, categories and nullable types are hashed value by value by pandas
+        h.update(pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy().data)
+    return(h.hexdigest()[:32])
+
+def column_hashes(data, block_rows=4096):
+    """
+    Calculates column_hash for every column of a dataframe.
+
+    Parameters
+    ----------
+    data (pandas.DataFrame): The data.
+    block_rows (int): Rows read at a time for the columns that are not contiguous. By default 4096.
+
+    Returns
+    -------
+    list: The hash of each column.
+
+    Notes
+    -----
+    The columns of a dataframe built from a numpy matrix are strided. Instead of copying them one by one, which reads the whole matrix for each column,
+    they are copied by blocks of rows that stay in the CPU cache, and each piece is added to the hash of its column.
+    """
+    hashes = [None]*data.shape[1]
+    strided = {}
+    for i in range(data.shape[1]):
+        x = data.iloc[:, i]
+        values = x.to_numpy() if x.dtype.kind in "biufcmM" else None
+        if values is not None and not values.flags.c_contiguous:
+            strided[i] = (_hasher(x.dtype), values)
+        else:
+            hashes[i] = column_hash(x)
+    for start in range(0, len(data), block_rows):
+        for h, values in strided.values():
+            h.update(np.ascontiguousarray(values[start:start+block_rows]).view(np.uint8).data)
+    for i, (h, values) in strided.items():
+        hashes[i] = h.hexdigest()[:32]
+    return(hashes)
+
+def _key(*parts):
+    return(hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest())
+
+class ResultCache:
+    """
+    Cache of results with a least recently used memory level and an optional disk level.
+
+    Parameters
+    ----------
+    max_items (int): Number of results kept in memory. The least recently used ones are discarded. By default 4096.
+    directory (str, optional): Directory of the disk level, where every result is saved in a pickle file. By default there is no disk level.
+    max_bytes (int): Maximum size of the files of the disk level. The least recently used files are deleted when it is exceeded. By default 2**30 (1 GB).
+
+    Attributes
+    ----------
+    hits (int): Number of results found in the cache.
+    misses (int): Number of results not found.
+    """
+
+    def __init__(self, max_items=4096, directory=None, max_bytes=2**30):
+        self.max_items = max_items
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._files = None # size of each file of the disk level, in order of use
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, default=None):
+        """
+        Returns the result stored with key, or default if there is none.
+
+        Parameters
+        ----------
+        key (str): Key of the result.
+        default: Value returned when the key is not in the cache. By default None.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return(self._memory[key])
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".pkl")
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self._touch(key, path)
+                self._remember(key, value)
+                self.hits += 1
+                return(value)
+        self.misses += 1
+        return(default)
+
+    def set(self, key, value):
+        """
+        Stores a result.
+
+        Parameters
+        ----------
+        key (str): Key of the result.
+        value: The result. It must be picklable if there is a disk level.
+        """
+        self._remember(key, value)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".pkl")
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path) # other processes never read a partial file
+            self._touch(key, path)
+            self._evict()
+
+    def clear(self):
+        """Deletes all the results, in memory and on disk."""
+        self._memory.clear()
+        if self.directory is not None:
+            for key in list(self._disk_files()):
+                self._delete(key)
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _disk_files(self):
+        if self._files is None: # files of previous runs, from the least recently used one
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pkl")]
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            self._files = OrderedDict((entry.name[:-4], entry.stat().st_size) for entry in entries)
+        return(self._files)
+
+    def _touch(self, key, path):
+        files = self._disk_files()
+        os.utime(path) # the modification time records the last use for the next runs
+        files[key] = os.path.getsize(path)
+        files.move_to_end(key)
+
+    def _evict(self):
+        files = self._disk_files()
+        total = sum(files.values())
+        while total > self.max_bytes and len(files) > 1:
+            key = next(iter(files))
+            total -= files[key]
+            self._delete(key)
+
+    def _delete(self, key):
+        self._files.pop(key, None)
+        try:
+            os.remove(os.path.join(self.directory, key + ".pkl"))
+        except OSError:
+            pass
+
+_default_cache = ResultCache()
+
+def get_cache():
+    """Returns the cache used when the cached functions do not get one."""
+    return(_default_cache)
+
+def set_cache(cache):
+    """
+    Sets the cache used when the cached functions do not get one.
+
+    Parameters
+    ----------
+    cache (ResultCache): The new default cache.
+    """
+    global _default_cache
+    _default_cache = cache
+
+@profiling.instrument
+def cached_calc_metrics(data, cache=None):
+    """
+    Calculates the same metrics as calc_metrics, reusing the metric of every column whose values have not changed since it was cached.
+
+    Parameters
+    ----------
+    data (list, numpy.array or pandas.DataFrame): The data whose metrics are going to be calculated.
+    cache (ResultCache, optional): Cache of the results. By default the one of get_cache.
+
+    Returns
+    -------
+    (float or pd.Series): The calculated metric according to the type of data, like calc_metrics.
+
+    Notes
+    -----
+    The AUC depends on all the columns, so it is cached for the whole table. The variance or the entropy is cached for each column.
+    """
+    if cache is None:
+        cache = _default_cache
+    data = data2df(data)
+    if data is None:
+        return(None)
+    schema = infer_schema(data)
+    hashes = column_hashes(data)
+    continuous = (schema == CONTINUOUS).to_numpy()
+    boolean = (schema == BOOLEAN).to_numpy()
+
+    if boolean.any() and continuous.any() and (continuous | boolean).all():
+        key = _key("calc_metrics", "AUC", *hashes)
+        result = cache.get(key)
+        if result is None:
+            result = AUC(data)
+            cache.set(key, result)
+        return(result)
+
+    met = []
+    for i in range(data.shape[1]):
+        key = _key("calc_metrics", "variance" if continuous[i] else "entropy", hashes[i])
+        value = cache.get(key)
+        if value is None:
+            value = variance(data.iloc[:, i]) if continuous[i] else entropy(data.iloc[:, i])
+            cache.set(key, value)
+        met.append(value)
+    met = pd.Series(met, index=data.columns, dtype=float)
+    met.name = "Variance" if continuous.all() else "Entropy" if not continuous.any() else "Variance & Entropy"
+    return(met)
+
+def _pearson_rows(data, rows, dtype, hashes, cache):
+    """
+    Pearson's correlations of the columns rows with all the columns. Only those columns are normalized (copied): the others are used as they are, as
+    the product with a centered column does not depend on their mean, and divided by their norm. The norms are cached for each column, and the norm of
+    a normalized column is its product with the original one, so it comes with the same matrix product.
+    """
+    x = numeric_values(data, dtype) # a view if the data is a single block of that type
+    keys = [_key("norm", np.dtype(dtype), h) for h in hashes]
+    if len(rows) == data.shape[1]: # the symmetric product of all the columns costs half as much
+        z = _correlation._normalize_columns(data, dtype)
+        for key, norm in zip(keys, np.einsum("ij,ij->j", z, x)):
+            cache.set(key, float(norm) if norm > 0 else 0.0)
+        return(np.clip(z.T @ z, -1, 1))
+
+    z = _correlation._normalize_columns(data.iloc[:, rows], dtype)
+    r = z.T @ x
+    norms = np.array([cache.get(key, np.nan) for key in keys])
+    norms[rows] = r[np.arange(len(rows)), rows]
+    for j in np.flatnonzero(np.isnan(norms)): # constant columns, and norms evicted from the cache
+        centered = x[:, j] - x[:, j].mean()
+        norms[j] = np.sqrt(centered @ centered)
+    for j in rows:
+        cache.set(keys[j], float(norms[j]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r /= norms
+    r[:, ~(norms > 0)] = np.nan
+    return(np.clip(r, -1, 1))
+
+@profiling.instrument
+def cached_correlation(data, dtype="float64", cache=None):
+    """
+    Calculates the same matrix as correlation, reusing the value of every pair of columns that have not changed since it was cached. Only the pairs that
+    involve a changed column are calculated.
+
+    Parameters
+    ----------
+    data (pandas.dataframe): Data for which correlations will be calculated.
+    dtype (str or numpy.dtype): Floating point type used for the Pearson's correlations of numeric data. By default "float64".
+    cache (ResultCache, optional): Cache of the results. By default the one of get_cache.
+
+    Returns
+    -------
+    pandas.dataframe: Dataframe containing the correlations between pairs of columns. The rows and columns are labeled with the variable names.
+
+    Notes
+    -----
+    Each column has one cache entry with its correlations, indexed by the hashes of the other columns, so the pairs are looked up with one vectorized
+    search per column. The Pearson's correlations of the changed columns are calculated with a single matrix product.
+    """
+    if cache is None:
+        cache = _default_cache
+    data = data2df(data)
+    if data is None:
+        return(None)
+    N = data.shape[1]
+    names = data.columns.tolist()
+    method = "pearson" if is_num(data) else "mutual_info"
+    profiling.note_path(method)
+    hashes = column_hashes(data)
+    keys = [_key("correlation", method, np.dtype(dtype), h) for h in hashes]
+    r = np.full((N, N), np.nan)
+    known = np.zeros((N, N), dtype=bool)
+    same, unique = pd.factorize(np.array(hashes, dtype=object)) # identical columns share their hash
+    unique = pd.Index(unique)
+    for i, key in enumerate(keys): # the cached correlations of each column, indexed by the hashes of the other columns
+        row = cache.get(key)
+        if row is not None:
+            position = unique.get_indexer(row.index)
+            found = position >= 0
+            values = np.full(len(unique), np.nan)
+            values[position[found]] = row.to_numpy()[found]
+            cached = np.zeros(len(unique), dtype=bool)
+            cached[position[found]] = True
+            known[i] = cached[same]
+            r[i] = values[same]
+    known |= known.T
+    r = np.where(np.isnan(r), r.T, r)
+
+    rows = np.flatnonzero(~known.any(axis=1)) # new or changed columns
+    rest = ~known
+    rest[rows, :] = rest[:, rows] = False
+    rows = np.union1d(rows, np.flatnonzero(rest.any(axis=1))).astype(np.intp) # pairs of unchanged columns never calculated together
+    if len(rows):
+        if method == "pearson":
+            r[rows, :] = _pearson_rows(data, rows, dtype, hashes, cache)
+        elif len(rows) == N:
+            r[:] = _correlation.mutual_info_matrix(data)
+        else:
+            codes, n_levels, H = _correlation._encode_columns(data)
+            for i in rows:
+                for j in range(N):
+                    r[i, j] = H[i] + H[j] - _correlation._joint_entropy(codes[:, i], n_levels[i], codes[:, j], n_levels[j])
+        r[:, rows] = r[rows, :].T
+        first = np.unique(same, return_index=True)[1] # identical columns have the same correlations
+        for i in np.flatnonzero(~known.all(axis=1)):
+            cache.set(keys[i], pd.Series(r[i, first], index=unique))
+    if method == "pearson":
+        r = r.astype(dtype)
+    return(pd.DataFrame(r, columns=names, index=names))
+
+@profiling.instrument
+def cached_discretize(data, num_bins, disc_alg="EW", cache=None):
+    """
+    Discretizes the data like discretize, reusing the cut points of every column whose values have not changed since they were cached.
+
+    Parameters
+    ----------
+    data (list, np.array, pandas.DataFrame): The data we want to discretize.
+    num_bins (int): Number of bins we want to create
+    disc_alg (str): The name of the algorithm, "EW" (equal width) or "EF" (equal frequency). By default "EW".
+    cache (ResultCache, optional): Cache of the results. By default the one of get_cache.
+
+    Returns
+    -------
+    data (pd.DataFrame): Dataframe with discretized values.
+    aux_p (list): List with the cut points.
+    """
+    if disc_alg not in ("EW", "EF"):
+        print("Either the algorithm you are trying to use or the name format is not recognized. Please select one of the following:\n -EW: Equal width\n -EF: Equal frequency")
+        return(None)
+    if cache is None:
+        cache = _default_cache
+    data = data2df(data)
+    if data is None:
+        return(None)
+
+    columns = {}
+    aux_p = []
+    for i, name in enumerate(data.columns):
+        x = data.iloc[:, i]
+        if not is_numeric_kind(x.dtype):
+            columns[name] = x
+            aux_p.append([])
+            continue
+        key = _key("discretize", disc_alg, num_bins, column_hash(x))
+        cut_pt = cache.get(key)
+        if cut_pt is None:
+            cut_pt = cut_points_EW(x.min(), x.max(), num_bins) if disc_alg == "EW" else cut_points_EF(numeric_values(x), num_bins)
+            cache.set(key, cut_pt)
+        columns[name] = discretize_generic(numeric_values(x), cut_pt)
+        aux_p.append(cut_pt)
+    return(pd.DataFrame(columns, index=data.index), aux_p)
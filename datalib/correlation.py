@@ -1,6 +1,11 @@
 from datalib.utils import *
+from datalib.dataset import MemmapDataset
+from datalib import profiling
 import numpy as np
 import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 def pearsons_correlation (x,y):   
     """This function calculates the Pearson's correlation coefficient between the vectors x and y. It will return a value between 0 and 1.
@@ -23,6 +28,145 @@ def pearsons_correlation (x,y):
     r = sum((x - np.mean(x)) * (y - np.mean(y))) / np.sqrt(sum((x - np.mean(x))**2) * sum((y - np.mean(y))**2))
     return(r)
 
+def _normalize_columns(data, dtype, block_size=None):
+    """Returns a copy of the data with every column centered and scaled to unit norm, so that the product of two columns is their Pearson's correlation."""
+    if isinstance(data, pd.DataFrame) and not all(isinstance(column_dtype, np.dtype) for column_dtype in data.dtypes):
+        data = numeric_values(data, dtype) # nullable types, with NaN for the missing values
+    z = np.array(data, dtype=dtype, order="F") # the only copy of the data, normalized in place
+    profiling.note_copy(z.nbytes)
+    N = z.shape[1]
+    if block_size is None:
+        block_size = max(N, 1)
+    
+    for start in range(0, N, block_size):
+        block = z[:, start:start+block_size]
+        block -= block.mean(axis=0)
+        norms = np.sqrt(np.einsum("ij,ij->j", block, block))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            block /= norms
+    return(z)
+
+@profiling.instrument
+def pearsons_correlation_matrix (data, dtype="float64", block_size=None):
+    """This function calculates the Pearson's correlation coefficient between every pair of columns of a numeric matrix.
+    
+    The columns are centered and normalized only once, so that the whole correlation matrix is the product of the normalized matrix with its transpose. 
+    This product is computed for blocks of block_size columns at a time, which bounds the size of the intermediate results for wide tables.
+    
+    Parameters
+    ----------
+        data (numpy.array or pandas.DataFrame): Numeric matrix with one variable per column.
+        dtype (str or numpy.dtype): Floating point type used for the computation. "float32" halves the memory at the cost of precision. By default "float64".
+        block_size (int, optional): Number of columns processed at a time. By default all the columns are processed at once.
+        
+    Returns
+    -------
+        r (numpy.array): Matrix with the Pearson's correlation coefficients. Constant columns have NaN correlations.
+    """
+    
+    z = _normalize_columns(data, dtype, block_size)
+    N = z.shape[1]
+    if block_size is None:
+        block_size = max(N, 1)
+    
+    r = np.empty((N, N), dtype=dtype)
+    for start in range(0, N, block_size):
+        stop = min(start+block_size, N)
+        r[start:stop, start:] = z[:, start:stop].T @ z[:, start:]
+        r[start:, start:stop] = r[start:stop, start:].T
+    np.clip(r, -1, 1, out=r)
+    return(r)
+
+class _CoMoments:
+    """
+    Mergeable count, means and co-moments (sums of products of the deviations from the means) of numeric columns, from which the Pearson's correlations 
+    are calculated. The moments of each block of rows are combined with the previous ones with the parallel algorithm of Chan et al., so the data can be 
+    read by blocks. The same formulas solved for the other part remove a block that was added before.
+    """
+    
+    def __init__(self, n_cols, dtype="float64"):
+        self.n = 0
+        self.mean = np.zeros(n_cols, dtype=dtype)
+        self.comoment = np.zeros((n_cols, n_cols), dtype=dtype)
+    
+    def update(self, x):
+        """Adds a block of rows (one variable per column)."""
+        x = np.asarray(x, dtype=self.mean.dtype)
+        if len(x) == 0:
+            return(self)
+        mean = x.mean(axis=0)
+        x = x - mean
+        return(self._merge(len(x), mean, x.T @ x))
+    
+    def merge(self, other):
+        """Adds the moments of other rows of the same columns."""
+        return(self._merge(other.n, other.mean, other.comoment))
+    
+    def remove(self, x):
+        """Removes a block of rows that was added before."""
+        x = np.asarray(x, dtype=self.mean.dtype)
+        if len(x) == 0:
+            return(self)
+        n = len(x)
+        total = self.n
+        if n > total:
+            raise ValueError(f"Cannot remove {n} rows from moments of {total} rows.")
+        if n == total:
+            self.n = 0
+            self.mean[:] = 0
+            self.comoment[:] = 0
+            return(self)
+        mean = x.mean(axis=0)
+        x = x - mean
+        rest = total - n
+        rest_mean = self.mean + (self.mean - mean)*(n/rest)
+        delta = mean - rest_mean
+        self.comoment -= x.T @ x + np.outer(delta, delta)*(rest*n/total)
+        self.mean = rest_mean
+        self.n = rest
+        return(self)
+    
+    def correlation(self):
+        """Matrix of Pearson's correlation coefficients. Constant columns have NaN correlations."""
+        norms = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = self.comoment/np.outer(norms, norms)
+        np.clip(r, -1, 1, out=r)
+        return(r)
+    
+    def _merge(self, n, mean, comoment):
+        if n == 0:
+            return(self)
+        total = self.n + n
+        delta = mean - self.mean
+        self.comoment += comoment + np.outer(delta, delta)*(self.n*n/total)
+        self.mean += delta*(n/total)
+        self.n = total
+        return(self)
+
+def _dataset_comoments(dataset, start, stop, dtype):
+    moments = _CoMoments(dataset.shape[1], dtype)
+    for block in dataset.iter_blocks(start=start, stop=stop):
+        moments.update(block)
+    return(moments)
+
+def _dataset_correlation(dataset, dtype="float64", n_jobs=1):
+    """Pearson's correlation matrix of a MemmapDataset, streaming its row blocks through _CoMoments, in n_jobs processes that read different rows."""
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    n_rows = dataset.shape[0]
+    if n_jobs == 1 or n_rows < 2*dataset.block_rows:
+        profiling.note_path("serial")
+        return(_dataset_comoments(dataset, 0, n_rows, dtype).correlation())
+    
+    profiling.note_path("parallel")
+    step = -(-n_rows//n_jobs)
+    moments = _CoMoments(dataset.shape[1], dtype)
+    with ProcessPoolExecutor(n_jobs) as pool: # the workers open the files again, only the paths are sent
+        for part in pool.map(_dataset_comoments, [dataset]*n_jobs, range(0, n_rows, step), range(step, n_rows+step, step), [dtype]*n_jobs):
+            moments.merge(part)
+    return(moments.correlation())
+
 def entropy_from_prob (prob, normalize=False):
     """
     Calculates the entropy from the probabilities.
@@ -51,6 +195,28 @@ def entropy_from_prob (prob, normalize=False):
     else:
         return(H)
 
+def _entropy_from_counts(counts, total=None):
+    """Entropy of the distribution given by a vector of counts. The probabilities are the counts divided by total, by default their sum."""
+    counts = counts[counts > 0]
+    prob = counts/(counts.sum() if total is None else total)
+    return(float(-np.sum(prob*np.log(prob))))
+
+def _joint_entropy(cx, nx, cy, ny):
+    """
+    Entropy of the joint distribution of two code vectors, counted with a single bincount over the combined codes. The pairs with a missing value 
+    (code -1) are not counted, but the probabilities are divided by the length of the vectors.
+    """
+    joint = cx*ny + cy
+    missing = (cx < 0) | (cy < 0)
+    if missing.any():
+        joint = joint[~missing]
+    if nx*ny <= 4*len(joint):
+        counts = np.bincount(joint, minlength=nx*ny)
+    else: # too many empty cells for a dense table
+        counts = np.unique(joint, return_counts=True)[1]
+    return(_entropy_from_counts(counts, len(cx)))
+
+@profiling.instrument
 def mutual_info(x, y):
     """
     Calculate the mutual information between two vectors.
@@ -67,59 +233,378 @@ def mutual_info(x, y):
     Returns
     -------
     float: Mutual information between x and y.
+    
+    Notes
+    -----
+    The vectors are encoded as integer codes and the joint counts are obtained with a single bincount, so the cost is linear in the length of the vectors.
+    Like in entropy, missing values are not counted but the probabilities are divided by the length of the vectors.
     """
     
-    x_uniq = np.unique(x)
-    y_uniq = np.unique(y)
+    cx, nx = factorize(x)
+    cy, ny = factorize(y)
+    Hx = _entropy_from_counts(np.bincount(cx[cx >= 0], minlength=nx), len(cx))
+    Hy = _entropy_from_counts(np.bincount(cy[cy >= 0], minlength=ny), len(cy))
+    Hxy = _joint_entropy(cx, nx, cy, ny)
+    return Hx+Hy- Hxy
+
+def _encode_columns(data):
+    """Factorizes every column of the dataframe once. Returns the matrix of codes (one column per variable), the number of levels and the entropy of each column."""
+    codes = np.empty(data.shape, dtype=np.intp, order="F")
+    n_levels = np.empty(data.shape[1], dtype=np.intp)
+    H = np.empty(data.shape[1])
+    for i, name in enumerate(data.columns):
+        codes[:, i], n_levels[i] = factorize(data.iloc[:, i])
+        c = codes[:, i]
+        H[i] = _entropy_from_counts(np.bincount(c[c >= 0], minlength=n_levels[i]), len(c))
+    profiling.note_copy(codes.nbytes)
+    return(codes, n_levels, H)
+
+def _pair_tiles(N, n_tiles):
+    """Splits the upper triangle of an NxN matrix in square tiles, returned as (start_i, stop_i, start_j, stop_j) and sorted from the most to the least pairs."""
+    size = max(1, int(np.ceil(N/np.sqrt(2*n_tiles))))
+    tiles = [(i, min(i+size, N), j, min(j+size, N)) for i in range(0, N, size) for j in range(i, N, size)]
+    return(sorted(tiles, key=lambda t: -(t[1]-t[0])*(t[3]-t[2])))
+
+_shared = {}
+
+def _attach_codes(name, shape, n_levels, H):
+    """Initializer of the worker processes: maps the shared matrix of codes without copying it."""
+    shm = shared_memory.SharedMemory(name=name)
+    _shared["shm"] = shm
+    _shared["codes"] = np.ndarray(shape, dtype=np.intp, buffer=shm.buf, order="F")
+    _shared["n_levels"] = n_levels
+    _shared["H"] = H
+
+def _mutual_info_tile(tile):
+    """Computes the mutual information of the pairs of a tile with the codes of the worker."""
+    i0, i1, j0, j1 = tile
+    codes, n_levels, H = _shared["codes"], _shared["n_levels"], _shared["H"]
+    mi = np.zeros((i1-i0, j1-j0))
+    for i in range(i0, i1):
+        for j in range(max(j0, i+1), j1):
+            mi[i-i0, j-j0] = H[i] + H[j] - _joint_entropy(codes[:, i], n_levels[i], codes[:, j], n_levels[j])
+    return(tile, mi)
+
+@profiling.instrument
+def mutual_info_matrix(data, n_jobs=1):
+    """
+    Calculates the mutual information between every pair of columns of a dataframe.
     
-    px = np.array([len(x.loc[x==x_val])/len(x) for x_val in x_uniq])
-    Hx = entropy_from_prob(px)
+    Each column is encoded as integer codes and its entropy is calculated only once, so for each pair only the joint entropy has to be computed.
     
-    py = np.array([len(y.loc[y==y_val])/len(y) for y_val in y_uniq])
-    Hy = entropy_from_prob(py)
+    Parameters
+    ----------
+    data (pandas.DataFrame): Data with one variable per column.
+    n_jobs (int): Number of processes. The upper triangle of the matrix is split in tiles with a similar number of pairs, and the codes are shared with 
+        the processes through shared memory instead of being sent with each tile. -1 uses all the CPUs. By default 1.
     
-    pxy=[]
-    for y_val in y_uniq:
-        ind = y.loc[y==y_val].index.tolist()
-        x_aux = x.loc[ind]
-        pxy.append([len(x_aux.loc[x_aux == x_val])/len(x) for x_val in x_uniq])
-        
-    pxy = np.transpose(pxy)
-    Hxy = sum([entropy_from_prob(pi) for pi in pxy])
-    return Hx+Hy- Hxy
+    Returns
+    -------
+    mi (np.array): Symmetric matrix with the mutual information between pairs of columns. The diagonal contains the entropy of each column.
+    """
+    codes, n_levels, H = _encode_columns(data)
+    N = len(H)
+    mi = np.diag(H)
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    
+    if n_jobs == 1 or N < 3:
+        profiling.note_path("serial")
+        for i in range(N):
+            for j in range(i+1,N):
+                mi[i,j] = H[i] + H[j] - _joint_entropy(codes[:, i], n_levels[i], codes[:, j], n_levels[j])
+                mi[j,i] = mi[i,j]
+        return(mi)
+    
+    profiling.note_path("parallel")
+    shm = shared_memory.SharedMemory(create=True, size=max(codes.nbytes, 1))
+    try:
+        np.ndarray(codes.shape, dtype=np.intp, buffer=shm.buf, order="F")[:] = codes
+        del codes
+        with ProcessPoolExecutor(n_jobs, initializer=_attach_codes, initargs=(shm.name, data.shape, n_levels, H)) as pool:
+            for (i0, i1, j0, j1), tile in pool.map(_mutual_info_tile, _pair_tiles(N, 4*n_jobs)):
+                mi[i0:i1, j0:j1] += tile
+    finally:
+        shm.close()
+        shm.unlink()
+    return(np.triu(mi) + np.triu(mi, 1).T)
 
-def correlation(data):
+@profiling.instrument
+def correlation(data, dtype="float64", block_size=None, n_jobs=1):
     """
      This function calculates Pearson's correlation between pairs of columns if the data is continuous and mutual information if it is categorical.
      
      Parameters
      ----------
-     data (pandas.dataframe): Data for which correlations will be calculated.
+     data (pandas.dataframe or MemmapDataset): Data for which correlations will be calculated. The Pearson's correlations of a MemmapDataset are 
+         calculated from its row blocks, so it does not need to fit in memory.
+     dtype (str or numpy.dtype): Floating point type used for the Pearson's correlations of numeric data. By default "float64".
+     block_size (int, optional): Number of columns processed at a time for numeric data. By default all the columns are processed at once.
+     n_jobs (int): Number of processes used for the mutual information of categorical data, or for the row blocks of a MemmapDataset. -1 uses all the 
+         CPUs. By default 1.
      
      Returns
      -------
      pandas.dataframe: Dataframe containing the correlations between pairs of columns. The rows and columns are labeled with the variable names.
      """    
     
+    if isinstance(data, MemmapDataset):
+        profiling.note_path("pearson")
+        return(pd.DataFrame(_dataset_correlation(data, dtype, n_jobs), columns=data.names, index=data.names))
+    
     try:
         data = data2df(data)
     except:
         return(None)
+    if data is None:
+        return(None)
     
     N = len(data.columns)
     names = data.columns.tolist()
-    mi = np.zeros((N,N))
     
     if is_num(data):
-        for i in range(N):
-            for j in range(i,N):
-                mi[i,j] = pearsons_correlation(data[names[i]],data[names[j]])
-                mi[j,i] = pearsons_correlation(data[names[i]],data[names[j]])
-        return(pd.DataFrame(mi,columns=names, index =names))
+        profiling.note_path("pearson")
+        r = pearsons_correlation_matrix(data, dtype=dtype, block_size=block_size)
+        return(pd.DataFrame(r,columns=names, index =names))
     
     elif not is_num(data):
-        for i in range(N):
-            for j in range(i,N):
-                mi[i,j] = mutual_info(data[names[i]],data[names[j]])
-                mi[j,i] = mutual_info(data[names[i]],data[names[j]])
-        return(pd.DataFrame(mi,columns=names, index =names))
\ No newline at end of file
+        profiling.note_path("mutual_info")
+        mi = mutual_info_matrix(data, n_jobs=n_jobs)
+        return(pd.DataFrame(mi,columns=names, index =names))
+
+def _select_edges(values, rows, top_k, threshold, by_abs):
+    """Selects the strongest associations of a block of rows of the correlation matrix. The diagonal must be NaN."""
+    score = np.abs(values) if by_abs else values.copy()
+    score[np.isnan(score)] = -np.inf
+    if threshold is not None:
+        score[score < threshold] = -np.inf
+    if top_k is None:
+        score[np.arange(len(rows))[:, None] >= np.arange(values.shape[1])[None, :] - rows[0]] = -np.inf # each pair only once
+        i, j = np.nonzero(score > -np.inf)
+    else:
+        k = min(top_k, values.shape[1]-1)
+        if k < 1:
+            return(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+        j = np.argpartition(-score, k-1, axis=1)[:, :k]
+        j = np.take_along_axis(j, np.argsort(-np.take_along_axis(score, j, axis=1), axis=1, kind="stable"), axis=1)
+        i = np.repeat(np.arange(len(rows)), k)
+        j = j.ravel()
+        keep = score[i, j] > -np.inf
+        i, j = i[keep], j[keep]
+    return(rows[i], j, values[i, j])
+
+@profiling.instrument
+def sparse_correlation(data, top_k=None, threshold=None, block_size=256, dtype="float64", output="edges"):
+    """
+     This function calculates the strongest correlations between pairs of columns without building the whole correlation matrix. It uses Pearson's correlation 
+     if the data is numeric and mutual information if it is categorical, like correlation.
+     
+     The matrix is computed for blocks of block_size columns at a time and only the top_k partners of each column, or the pairs whose absolute Pearson's 
+     correlation or mutual information is above threshold, are kept. The memory used depends on the size of the output and not on the square of the number of columns.
+     
+     Parameters
+     ----------
+     data (pandas.dataframe): Data for which correlations will be calculated.
+     top_k (int, optional): Number of partners kept for each column, the ones with the highest absolute correlation or mutual information.
+     threshold (float, optional): Minimum absolute correlation or mutual information of the kept pairs. It can be combined with top_k.
+     block_size (int): Number of columns processed at a time. By default 256.
+     dtype (str or numpy.dtype): Floating point type used for the Pearson's correlations of numeric data. By default "float64".
+     output (str): Format of the result. There are two options:
+                    -edges: pandas.DataFrame with the columns "var1", "var2" and "value", one row per kept pair.
+                    -csr: Compressed sparse rows, a tuple (indptr, indices, values, names) where the partners of column i are indices[indptr[i]:indptr[i+1]].
+                    By default "edges".
+     
+     Returns
+     -------
+     pandas.dataframe or tuple: The kept pairs in the selected format.
+     
+     Notes
+     -----
+     When only threshold is given each pair appears once. With top_k the partners are listed for every column, so a pair can appear in both directions.
+     """
+    
+    if top_k is None and threshold is None:
+        print("Either top_k or threshold must be given. Use correlation to calculate the whole matrix.")
+        return(None)
+    try:
+        data = data2df(data)
+    except:
+        return(None)
+    if data is None:
+        return(None)
+    
+    N = len(data.columns)
+    names = data.columns.tolist()
+    sources, targets, values = [], [], []
+    
+    if is_num(data):
+        profiling.note_path("pearson")
+        z = _normalize_columns(data, dtype, block_size)
+        for start in range(0, N, block_size):
+            rows = np.arange(start, min(start+block_size, N))
+            r = np.clip(z[:, rows].T @ z, -1, 1)
+            r[np.arange(len(rows)), rows] = np.nan
+            i, j, v = _select_edges(r, rows, top_k, threshold, by_abs=True)
+            sources.append(i); targets.append(j); values.append(v)
+    else:
+        profiling.note_path("mutual_info")
+        codes, n_levels, H = _encode_columns(data)
+        for start in range(0, N, block_size):
+            rows = np.arange(start, min(start+block_size, N))
+            mi = np.full((len(rows), N), np.nan)
+            for a, i in enumerate(rows):
+                for j in range(N) if top_k is not None else range(i+1, N): # without top_k only the upper triangle is kept
+                    if j != i:
+                        mi[a, j] = H[i] + H[j] - _joint_entropy(codes[:, i], n_levels[i], codes[:, j], n_levels[j])
+            i, j, v = _select_edges(mi, rows, top_k, threshold, by_abs=False)
+            sources.append(i); targets.append(j); values.append(v)
+    
+    sources, targets, values = np.concatenate(sources), np.concatenate(targets), np.concatenate(values)
+    if output == "csr":
+        indptr = np.searchsorted(sources, np.arange(N+1))
+        return(indptr, targets, values, names)
+    else:
+        names = np.array(names, dtype=object)
+        return(pd.DataFrame({"var1": names[sources], "var2": names[targets], "value": values}))
+
+class CorrelationTracker:
+    """
+    Keeps the correlation matrix of a window of data up to date as chunks of rows are added and removed, without calculating it again from all the rows.
+    
+    Numeric data keeps the count, means and co-moment matrix of the columns, which are updated with the formulas of Chan et al. (and the same formulas 
+    solved for the removed part). Other data keeps the counts of the values of each column and the contingency table of each pair of columns, which grow 
+    when new values appear. Adding or removing a chunk costs time proportional to its size (times the number of pairs), not to the size of the window.
+    
+    Attributes
+    ----------
+    columns (list): Names of the columns, from the first chunk.
+    numeric (bool): True if the Pearson's correlation is tracked, False for the mutual information.
+    n (int): Number of rows in the window.
+    
+    Notes
+    -----
+    Numeric chunks with missing values are rejected with a ValueError, because a NaN would stay in the co-moments after its chunk is removed.
+    The rounding errors of many additions and removals accumulate in the co-moments, so for very long runs it can be worth starting a new tracker with
+    the current window from time to time.
+    """
+    
+    def __init__(self):
+        self.columns = None
+        self.numeric = None
+        self.n = 0
+    
+    @profiling.instrument
+    def add(self, chunk):
+        """
+        Adds a chunk of rows to the window.
+        
+        Parameters
+        ----------
+        chunk (list, numpy.array or pandas.DataFrame): Rows with the same columns as the first chunk. Numeric rows cannot have missing values.
+        
+        Returns
+        -------
+        CorrelationTracker: The tracker itself.
+        """
+        chunk = data2df(chunk)
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+            self.numeric = is_num(chunk)
+            if self.numeric:
+                self._moments = _CoMoments(len(self.columns))
+            else:
+                self._levels = [pd.Index([]) for name in self.columns]
+                self._counts = [np.zeros(0, dtype=np.int64) for name in self.columns]
+                self._tables = {}
+        self._update(chunk[self.columns], 1)
+        return(self)
+    
+    @profiling.instrument
+    def remove(self, chunk):
+        """
+        Removes from the window a chunk of rows that was added before, for example the oldest one of a sliding window.
+        
+        Parameters
+        ----------
+        chunk (list, numpy.array or pandas.DataFrame): Rows that were added with add.
+        
+        Returns
+        -------
+        CorrelationTracker: The tracker itself.
+        """
+        if self.columns is None:
+            raise ValueError("No rows have been added to the tracker.")
+        chunk = data2df(chunk)
+        if len(chunk) > self.n:
+            raise ValueError(f"Cannot remove {len(chunk)} rows from a window of {self.n} rows.")
+        self._update(chunk[self.columns], -1)
+        return(self)
+    
+    @profiling.instrument
+    def correlation(self):
+        """
+        Calculates the correlation matrix of the rows in the window, like correlation.
+        
+        Returns
+        -------
+        pandas.dataframe: Pearson's correlations of numeric data or mutual information of categorical data between every pair of columns.
+        """
+        if self.numeric:
+            profiling.note_path("pearson")
+            return(pd.DataFrame(self._moments.correlation(), columns=self.columns, index=self.columns))
+        profiling.note_path("mutual_info")
+        N = len(self.columns)
+        H = [_entropy_from_counts(counts, self.n) if self.n else 0.0 for counts in self._counts]
+        mi = np.diag(np.array(H, dtype=float))
+        for (i, j), table in self._tables.items():
+            if self.n:
+                mi[i, j] = mi[j, i] = H[i] + H[j] - _entropy_from_counts(table.ravel(), self.n)
+        return(pd.DataFrame(mi, columns=self.columns, index=self.columns))
+    
+    def _update(self, chunk, sign):
+        if self.numeric:
+            values = chunk.to_numpy(dtype=float, na_value=np.nan)
+            if np.isnan(values).any():
+                raise ValueError("The chunk has missing values, which cannot be added to or removed from the co-moments.")
+            if sign > 0:
+                self._moments.update(values)
+            else:
+                self._moments.remove(values)
+        else:
+            codes = [self._encode(i, chunk.iloc[:, i], sign) for i in range(len(self.columns))]
+            counts = [self._counts[i] + sign*np.bincount(c[c >= 0], minlength=len(self._counts[i])) for i, c in enumerate(codes)]
+            for i, c in enumerate(counts):
+                if (c < 0).any():
+                    raise ValueError(f"The column {self.columns[i]} has values that were removed more times than they were added.")
+            self._counts = counts
+            for i in range(len(codes)):
+                for j in range(i+1, len(codes)):
+                    self._add_pairs(i, j, codes[i], codes[j], sign)
+        self.n += sign*len(chunk)
+    
+    def _encode(self, i, values, sign):
+        """Codes of the values of column i in its levels, or -1 for the missing values, which are not counted. New levels are added for new values."""
+        missing = pd.isna(values).to_numpy()
+        codes = self._levels[i].get_indexer(values)
+        new = (codes < 0) & ~missing
+        if new.any():
+            if sign < 0:
+                raise ValueError(f"The column {self.columns[i]} has values that were never added.")
+            self._levels[i] = self._levels[i].append(pd.Index(pd.unique(values[new])))
+            self._counts[i] = np.r_[self._counts[i], np.zeros(len(self._levels[i])-len(self._counts[i]), dtype=np.int64)]
+            codes = self._levels[i].get_indexer(values)
+        codes[missing] = -1
+        return(codes)
+    
+    def _add_pairs(self, i, j, ci, cj, sign):
+        """Adds the pairs of codes of the chunk to the contingency table of columns i and j, growing it if there are new levels."""
+        shape = (len(self._levels[i]), len(self._levels[j]))
+        table = self._tables.get((i, j))
+        if table is None:
+            table = np.zeros(shape, dtype=np.int64)
+        elif table.shape != shape:
+            table = np.pad(table, [(0, shape[0]-table.shape[0]), (0, shape[1]-table.shape[1])])
+        present = (ci >= 0) & (cj >= 0)
+        pairs, counts = np.unique((ci*shape[1] + cj)[present], return_counts=True)
+        table.ravel()[pairs] += sign*counts
+        self._tables[(i, j)] = table
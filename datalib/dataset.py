@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import os
+
+class MemmapDataset:
+    """
+    Read-only table stored on disk, as a .npy file or as one flat binary file per column, which is opened with numpy.memmap instead of being loaded.
+
+    The values are only read when a row block or a column is requested, so the operating system pages them in and out of its cache as needed and the
+    table can be larger than the memory. correlation, calc_metrics, discretize and feature_scaling accept a MemmapDataset and process it by blocks.
+
+    Parameters
+    ----------
+    source (str, list or dict): Path of a .npy file with a matrix (one variable per column) or a vector, a list of paths of flat binary files with
+        one column each, or a dictionary with the name and the path of each column file.
+    dtype (str or numpy.dtype, optional): Type of the values of the flat binary files. It is required for them, a .npy file has its own type.
+    names (list, optional): Names of the columns. By default "Var 1", "Var 2", ... for a .npy file (like utils.data2df) and the file names without
+        extension for a list of column files.
+    block_bytes (int): Approximate size of the row blocks and column groups returned by iter_blocks and iter_column_groups. By default 2**27 (128 MB).
+
+    Attributes
+    ----------
+    names (list): Names of the columns.
+    shape (tuple): Number of rows and columns.
+    dtypes (pd.Series): Type of each column.
+
+    Notes
+    -----
+    Row blocks of a .npy file are views of the file, without copies. The columns of a .npy file in C order are strided, so reading a column reads the
+    whole file: process it by row blocks when possible. Flat column files are the opposite.
+    """
+
+    def __init__(self, source, dtype=None, names=None, block_bytes=2**27):
+        self.source = source
+        self.dtype = dtype
+        self.block_bytes = block_bytes
+        if isinstance(source, (str, os.PathLike)):
+            self._matrix = np.load(source, mmap_mode="r")
+            if self._matrix.ndim == 1:
+                self._matrix = self._matrix.reshape(-1, 1)
+            elif self._matrix.ndim != 2:
+                raise ValueError("The .npy file must contain a vector or a matrix.")
+            self._columns = None
+            default_names = [f"Var {i+1}" for i in range(self._matrix.shape[1])]
+            self.shape = self._matrix.shape
+            column_dtypes = [self._matrix.dtype]*self.shape[1]
+        else:
+            if dtype is None:
+                raise ValueError("The dtype of the flat binary column files is required.")
+            paths = list(source.values()) if isinstance(source, dict) else list(source)
+            self._matrix = None
+            self._columns = [np.memmap(path, dtype=dtype, mode="r") for path in paths]
+            if len({len(column) for column in self._columns}) > 1:
+                raise ValueError("All the column files must have the same number of values.")
+            default_names = list(source) if isinstance(source, dict) else [os.path.splitext(os.path.basename(path))[0] for path in paths]
+            self.shape = (len(self._columns[0]) if self._columns else 0, len(self._columns))
+            column_dtypes = [column.dtype for column in self._columns]
+        self.names = list(names) if names is not None else default_names
+        if len(self.names) != self.shape[1]:
+            raise ValueError(f"{len(self.names)} names were given for {self.shape[1]} columns.")
+        self.dtypes = pd.Series(column_dtypes, index=self.names, dtype=object)
+
+    def __len__(self):
+        return(self.shape[0])
+
+    def __iter__(self):
+        return(self.iter_blocks())
+
+    def __getstate__(self):
+        # the memory maps are opened again from the files, instead of pickling their values
+        return({"source": self.source, "dtype": self.dtype, "names": self.names, "block_bytes": self.block_bytes})
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def block_rows(self):
+        """Number of rows of the blocks of iter_blocks, so that each block has about block_bytes bytes."""
+        row_bytes = max(sum(dtype.itemsize for dtype in self.dtypes), 1)
+        return(max(self.block_bytes//row_bytes, 1))
+
+    def column(self, name):
+        """
+        Returns a column as a read-only vector backed by the file.
+
+        Parameters
+        ----------
+        name (str or int): Name or position of the column.
+
+        Returns
+        -------
+        numpy.memmap: The values of the column.
+        """
+        i = self.names.index(name) if not isinstance(name, (int, np.integer)) else name
+        return(self._matrix[:, i] if self._columns is None else self._columns[i])
+
+    def block(self, start, stop, columns=None):
+        """
+        Returns a block of rows.
+
+        Parameters
+        ----------
+        start (int): First row.
+        stop (int): Row after the last one.
+        columns (list, optional): Names of the columns. By default all of them.
+
+        Returns
+        -------
+        pd.DataFrame: The rows, indexed by their position in the dataset. The values of a .npy file are read-only views of the file.
+        """
+        names = self.names if columns is None else list(columns)
+        index = pd.RangeIndex(start, min(stop, self.shape[0]))
+        if self._columns is None:
+            values = self._matrix[start:stop] if columns is None else self._matrix[start:stop, [self.names.index(name) for name in names]]
+            return(pd.DataFrame(values, columns=names, index=index, copy=False))
+        return(pd.DataFrame({name: self.column(name)[start:stop] for name in names}, index=index))
+
+    def iter_blocks(self, block_rows=None, columns=None, start=0, stop=None):
+        """
+        Iterates over the rows by blocks.
+
+        Parameters
+        ----------
+        block_rows (int, optional): Number of rows of each block. By default block_rows, so each block has about block_bytes bytes.
+        columns (list, optional): Names of the columns. By default all of them.
+        start (int): First row. By default 0.
+        stop (int, optional): Row after the last one. By default the end of the dataset.
+
+        Returns
+        -------
+        generator: The blocks as pandas Dataframes (see block).
+        """
+        block_rows = block_rows or self.block_rows
+        stop = self.shape[0] if stop is None else min(stop, self.shape[0])
+        for i in range(start, stop, block_rows):
+            yield(self.block(i, min(i+block_rows, stop), columns))
+
+    def iter_column_groups(self, columns=None):
+        """
+        Iterates over groups of whole columns, as many per group as fit in block_bytes (at least one).
+
+        Parameters
+        ----------
+        columns (list, optional): Names of the columns. By default all of them.
+
+        Returns
+        -------
+        generator: The groups of columns as pandas Dataframes, with their own copy of the values.
+        """
+        names = self.names if columns is None else list(columns)
+        column_bytes = max(self.shape[0]*max((self.dtypes[name].itemsize for name in names), default=1), 1)
+        group = max(self.block_bytes//column_bytes, 1)
+        for i in range(0, len(names), group):
+            yield(pd.DataFrame({name: np.array(self.column(name)) for name in names[i:i+group]}))
+
+def save_npy(blocks, path, n_rows, names=None, dtype=None):
+    """
+    Writes row blocks to a .npy file, one block at a time, and opens the file as a MemmapDataset.
+
+    Parameters
+    ----------
+    blocks (iterable): Row blocks (numpy arrays or dataframes) with the same columns, for example the ones of MemmapDataset.iter_blocks.
+    path (str): Path of the .npy file.
+    n_rows (int): Total number of rows of the blocks.
+    names (list, optional): Names of the columns. By default the columns of the first block if it is a dataframe.
+    dtype (str or numpy.dtype, optional): Type of the values in the file. By default the type of the first block.
+
+    Returns
+    -------
+    MemmapDataset: The dataset stored in the file.
+    """
+    out = None
+    row = 0
+    for block in blocks:
+        if out is None:
+            if names is None and isinstance(block, pd.DataFrame):
+                names = block.columns.tolist()
+            values = np.asarray(block)
+            out = np.lib.format.open_memmap(path, mode="w+", dtype=dtype or values.dtype, shape=(n_rows, values.shape[1]))
+        out[row:row+len(block)] = np.asarray(block)
+        row += len(block)
+    if out is None:
+        raise ValueError("There are no blocks to save.")
+    out.flush()
+    del out
+    return(MemmapDataset(path, names=names))
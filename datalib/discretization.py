@@ -1,6 +1,10 @@
 from datalib.utils import *
+from datalib import profiling
+from datalib.sketches import KLLSketch
+from datalib.dataset import MemmapDataset
 import numpy as np
 import pandas as pd
+import json
 
 def get_gap_names(cut_pt):
     """This function takes in a vector of cut points and returns a character vector of the names of the intervals formed by those cut points. 
@@ -16,6 +20,9 @@ def get_gap_names(cut_pt):
     aux (list) : Gaps.
     """
     
+    if len(cut_pt)==0:
+        return(["( -infty , infty )"])
+    
     aux = []
     aux.append(f"( -infty ,{cut_pt[0]}]")
   
@@ -43,26 +50,80 @@ def new_name_dict(levels,cut_pt):
         dict_names[levels[i]]= f"{levels[i]}:{level_names[i]}"
     return(dict_names)
 
-def discretize_generic (x, cut_pt):
+def get_level_names(cut_pt):
+    """This function gets the cut points and returns the names of the categories of the discretized variable, one per interval.
+
+    Parameters
+    ----------
+    cut_pt (numpy.array): Cut points
+
+    Returns
+    -------
+    list: Category names, in the format "I1:( -infty ,cut_1]".
+    """
+    return([f"I{i+1}:{gap}" for i, gap in enumerate(get_gap_names(cut_pt))])
+
+def discretize_generic (x, cut_pt, categories=None):
     """This function gets a vector and a list of cut points and discretizes the vector by using them
 
     Parameters
     ----------
     x (list, np.array, pandas.DataFrame): The vector we want to discretize
-    cut_pt (np.array): Array of cut points
+    cut_pt (np.array): Array of cut points, in increasing order
+    categories (list, optional): Names of the intervals. If they are not given they will be calculated with get_level_names.
 
     Returns
     -------
     pandas.Categorical: Discretized vector with categorical values
-    """
-    level = ["I"+str(i) for i in range(1,(len(cut_pt)+2))]# num_bins+1
     
-    categorical = np.repeat (level[-1],len(x))
-    for i in reversed(range(len(cut_pt))):
-        categorical[x<=cut_pt[i]]=level[i]
-    categorical = pd.Categorical(categorical,categories=level)
-    return(categorical.rename_categories(new_name_dict(categorical.categories.tolist(),cut_pt)))
+    Notes
+    -----
+    The interval of each value is found with a single binary search (numpy.searchsorted) and the result is built from the integer codes, so no string is created per value.
+    """
+    if categories is None:
+        categories = get_level_names(cut_pt)
+    codes = np.searchsorted(cut_pt, np.asarray(x), side="left") # first cut point >= x, so the intervals are closed on the right
+    return(pd.Categorical.from_codes(codes, categories=categories))
+
+def cut_points_EW(x_min, x_max, num_bins):
+    """This function gets the minimum and maximum of a vector and returns the cut points of the equal width algorithm.
+
+    Parameters
+    ----------
+    x_min (float): Minimum of the vector
+    x_max (float): Maximum of the vector
+    num_bins (int): Number of bins we want to create
+
+    Returns
+    -------
+    cut_pt (numpy.array): Cut points
+    """
+    step = (x_max-x_min)/num_bins
+    return(x_min + step*np.arange(1, num_bins))
+
+def cut_points_EF(x, num_bins):
+    """This function gets a vector or a matrix and returns the cut points of the equal frequency algorithm for each column.
+
+    The cut points are the values in the positions freq, 2*freq, ... of the ordered vector, where freq is the number of values per bin. Only those 
+    positions are ordered (numpy.partition), which is linear instead of sorting the whole vector.
+
+    Parameters
+    ----------
+    x (np.array): The vector or the matrix (one variable per column) we want to discretize
+    num_bins (int): Number of bins we want to create
 
+    Returns
+    -------
+    cut_pt (numpy.array): Cut points, a vector or a matrix with one column per variable
+    """
+    n = len(x)
+    freq = max(round(n/num_bins), 1)
+    cut_ind = np.arange(freq, n, freq)
+    if len(cut_ind)==0:
+        return(np.partition(x, 0, axis=0)[cut_ind])
+    return(np.partition(x, cut_ind, axis=0)[cut_ind])
+
+@profiling.instrument
 def discretizeEW(x, num_bins):
     """This function gets a vector and the number of bins that we want to create and discretizes it using the equal width algorithm.
     
@@ -79,20 +140,15 @@ def discretizeEW(x, num_bins):
     categorical (pandas.Categorical): Discretized vector with categorical values
     cut_pt (numpy.array):Cut points
     """
+    x = np.asarray(x)
     if np.issubdtype(x.dtype, np.number):
-        step = (max(x)-min(x))/(num_bins)
-        cut_pt = np.repeat(min(x),num_bins-1)
-
-
-        for i in range(len(cut_pt)):
-            cut_pt[i:len(cut_pt)] = cut_pt[i:len(cut_pt)]+step
-
+        cut_pt = cut_points_EW(np.nanmin(x), np.nanmax(x), num_bins)
         categorical = discretize_generic (x, cut_pt)
-
         return(categorical, cut_pt)
     else: 
         return(x,[])
 
+@profiling.instrument
 def discretizeEF(x, num_bins):  
     """This function gets a vector and the number of bins that we want to create and discretizes it using the equal frequency algorithm.
     
@@ -110,26 +166,23 @@ def discretizeEF(x, num_bins):
     categorical (pandas.Categorical): Discretized vector with categorical values
     cut_pt (numpy.array):Cut points
     """
+    x = np.asarray(x)
     if np.issubdtype(x.dtype, np.number):
-        
-        ordered = np.sort(x)    
-        freq = round(len(x)/num_bins)
-        cut_ind=range(freq,len(x),freq)
-        cut_pt = ordered[cut_ind]
-        
+        cut_pt = cut_points_EF(x, num_bins)
         categorical = discretize_generic (x, cut_pt)
         return(categorical, cut_pt)
     
     else:
         return(x,[]) #Input data is not numeric
 
+@profiling.instrument
 def discretize (data,num_bins, disc_alg ="EW"):
     
     """This function gets a data and the number of bins that we want to create and discretizes it using the equal width or the equal frecuency algorithm.
 
     Parameters
     ----------
-    data (list, np.array, pandas.DataFrame): The data we want to discretize.
+    data (list, np.array, pandas.DataFrame or MemmapDataset): The data we want to discretize.
     num_bins (int): Number of bins we want to create
     disc_alg (str): The name of the algorithm we want to use. There are two options:
                     -EW: Equal width
@@ -138,27 +191,301 @@ def discretize (data,num_bins, disc_alg ="EW"):
 
     Returns
     -------
-    data (pd.DataFrame): Dataframe with discretized values.
+    data (pd.DataFrame or generator): Dataframe with discretized values. For a MemmapDataset, a generator of the discretized row blocks.
     aux_p (list): List with the cut points.
+    
+    Notes
+    -----
+    The cut points of all the numeric columns are calculated at once (column minimums and maximums for EW, a partition of the matrix for EF). Then each 
+    column is discretized with discretize_generic and stored as a categorical column. Non numeric columns are returned unchanged, with no cut points.
     """
-    data = np.transpose(data2df (data)) # transpose to loop columnwise
+    if disc_alg not in ("EW", "EF"):
+        print("Either the algorithm you are trying to use or the name format is not recognized. Please select one of the following:\n -EW: Equal width\n -EF: Equal frequency") 
+        return(None)
+    
+    profiling.note_path(disc_alg)
+    if isinstance(data, MemmapDataset):
+        return(_discretize_dataset(data, num_bins, disc_alg))
+    data = data2df (data)
+    if data is None:
+        return(None)
+    numeric = [is_numeric_kind(dtype) for dtype in data.dtypes]
+    num_data = data.loc[:, numeric]
     
     if disc_alg == "EW":
-
-        aux_p = []
-        for i, row in enumerate(data.values):
-            categorical, cut_pt = discretizeEW(row, num_bins)
-            data.loc[data.index[i]]=categorical
-            aux_p.append(cut_pt)
-        return (np.transpose(data), aux_p)
-
-    elif disc_alg == "EF":
-        aux_p = []
-        for i, row in enumerate(data.values):
-            categorical, cut_pt = discretizeEF(row, num_bins)
-            data.loc[data.index[i]]=categorical
-            aux_p.append(cut_pt)
-        return (np.transpose(data), aux_p)
+        cut_pts = [cut_points_EW(lo, hi, num_bins) for lo, hi in zip(num_data.min().to_numpy(), num_data.max().to_numpy())]
     else:
-        print("Either the algorithm you are trying to use or the name format is not recognized. Please select one of the following:\n -EW: Equal width\n -EF: Equal frequency") 
+        profiling.note_copy(num_data.memory_usage(index=False).sum())
+        if num_data.dtypes.nunique() == 1: # a single partition of the whole matrix
+            cut_pts = list(cut_points_EF(numeric_values(num_data), num_bins).T)
+        else: # keep the type of each column in the cut points
+            cut_pts = [cut_points_EF(numeric_values(num_data.iloc[:, i]), num_bins) for i in range(num_data.shape[1])]
+    
+    columns = {}
+    aux_p = []
+    cut_pts = iter(cut_pts)
+    for i, name in enumerate(data.columns):
+        if numeric[i]:
+            cut_pt = next(cut_pts)
+            columns[name] = discretize_generic(numeric_values(data.iloc[:, i]), cut_pt)
+        else:
+            cut_pt = []
+            columns[name] = data.iloc[:, i]
+        aux_p.append(cut_pt)
+    return (pd.DataFrame(columns, index=data.index), aux_p)
+
+class _Discretizer:
+    """Common part of the discretizers: the fitted state is a dictionary with the array of cut points of each numeric column."""
+    
+    kind = None
+    
+    def __init__(self, num_bins):
+        self.num_bins = num_bins
+        self._reset()
+    
+    @profiling.instrument
+    def fit(self, data):
+        """
+        Calculates the cut points of every numeric column of the data, forgetting any previous fit.
+        
+        Parameters
+        ----------
+        data (list, np.array, pandas.DataFrame): The data used to calculate the cut points.
+        
+        Returns
+        -------
+        The discretizer itself.
+        """
+        self._reset()
+        return(self.partial_fit(data))
+    
+    @profiling.instrument
+    def partial_fit(self, data):
+        """
+        Updates the cut points with a new chunk of data, so they are calculated from all the chunks seen so far.
+        
+        Parameters
+        ----------
+        data (list, np.array, pandas.DataFrame): Chunk of data.
         
+        Returns
+        -------
+        The discretizer itself.
+        """
+        data = data2df(data)
+        for name in data.columns:
+            if is_numeric_kind(data[name].dtype):
+                self._update(name, numeric_values(data[name]))
+        self._categories = {}
+        return(self)
+    
+    @profiling.instrument
+    def transform(self, data):
+        """
+        Discretizes the data with the fitted cut points. Columns without cut points are returned unchanged.
+        
+        Parameters
+        ----------
+        data (list, np.array, pandas.DataFrame): The data we want to discretize.
+        
+        Returns
+        -------
+        pd.DataFrame: Dataframe with discretized values.
+        """
+        data = data2df(data)
+        columns = {}
+        for name in data.columns:
+            if name in self.cut_points_:
+                if name not in self._categories:
+                    self._categories[name] = get_level_names(self.cut_points_[name])
+                columns[name] = discretize_generic(numeric_values(data[name]), self.cut_points_[name], self._categories[name])
+            else:
+                columns[name] = data[name]
+        return(pd.DataFrame(columns, index=data.index))
+    
+    def merge(self, other):
+        """
+        Adds the data seen by another discretizer of the same type, for example one fitted by another worker on a different part of the data.
+        
+        Parameters
+        ----------
+        other: Discretizer of the same type and number of bins.
+        
+        Returns
+        -------
+        The discretizer itself.
+        """
+        if type(other) is not type(self) or other.num_bins != self.num_bins:
+            raise ValueError("Only discretizers of the same type and number of bins can be merged.")
+        for name in other.cut_points_:
+            self._merge(name, other)
+        self._categories = {}
+        return(self)
+    
+    def fit_transform(self, data):
+        """Fits the discretizer and discretizes the same data. See fit and transform."""
+        return(self.fit(data).transform(data))
+    
+    def save(self, path):
+        """
+        Saves the cut points in a numpy .npz file.
+        
+        Parameters
+        ----------
+        path (str): Path of the file.
+        """
+        meta = {"kind": self.kind, "num_bins": self.num_bins, "columns": list(self.cut_points_)}
+        arrays = {f"cut_{i}": np.asarray(cut_pt) for i, cut_pt in enumerate(self.cut_points_.values())}
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a discretizer saved with save. The returned discretizer can only be used to transform data.
+        
+        Parameters
+        ----------
+        path (str): Path of the file.
+        
+        Returns
+        -------
+        The discretizer with the saved cut points.
+        """
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            if cls.kind is not None and meta["kind"] != cls.kind:
+                raise ValueError(f"The file contains a {meta['kind']} discretizer.")
+            disc = _discretizer_classes[meta["kind"]](meta["num_bins"])
+            disc.cut_points_ = {name: f[f"cut_{i}"] for i, name in enumerate(meta["columns"])}
+        return(disc)
+    
+    def _reset(self):
+        self.cut_points_ = {}
+        self._categories = {}
+
+class EqualWidthDiscretizer(_Discretizer):
+    """
+    Discretizer that learns the cut points of the equal width algorithm (see discretizeEW) and applies them to new data.
+    
+    Parameters
+    ----------
+    num_bins (int): Number of bins we want to create
+    
+    Notes
+    -----
+    partial_fit only keeps the minimum and the maximum of each column.
+    """
+    
+    kind = "EW"
+    
+    def _reset(self):
+        super()._reset()
+        self.min_ = {}
+        self.max_ = {}
+    
+    def _update(self, name, x):
+        self.min_[name] = np.nanmin([np.nanmin(x), self.min_.get(name, np.nan)])
+        self.max_[name] = np.nanmax([np.nanmax(x), self.max_.get(name, np.nan)])
+        self.cut_points_[name] = cut_points_EW(self.min_[name], self.max_[name], self.num_bins)
+    
+    def _merge(self, name, other):
+        self._update(name, np.array([other.min_[name], other.max_[name]]))
+
+class EqualFrequencyDiscretizer(_Discretizer):
+    """
+    Discretizer that learns the cut points of the equal frequency algorithm (see discretizeEF) and applies them to new data.
+    
+    Parameters
+    ----------
+    num_bins (int): Number of bins we want to create
+    rank_error (float, optional): If it is given, the values of each column are summarized with a KLL quantile sketch (see sketches.KLLSketch) and 
+        the cut points are approximate, within this fraction of the number of values of the exact rank. By default fit calculates exact cut points and
+        partial_fit uses sketches with a rank error of partial_rank_error.
+    seed (int, optional): Seed of the sketches, for reproducible cut points.
+    
+    Attributes
+    ----------
+    partial_rank_error (float): Rank error of the sketches of partial_fit when rank_error is not given, 0.001. The sketches keep all the values until 
+        there are a few thousand of them, so the cut points of small data are exact.
+    
+    Notes
+    -----
+    The fitted state is the array of cut points of each column, plus a sketch of bounded size per column after partial_fit, so the discretizer can be 
+    fitted by chunks on data that does not fit in memory (for example the chunks of utils.iter_chunks). Discretizers fitted by different workers with 
+    partial_fit can be combined with merge.
+    """
+    
+    kind = "EF"
+    partial_rank_error = 0.001
+    
+    def __init__(self, num_bins, rank_error=None, seed=None):
+        self.rank_error = rank_error
+        self.seed = seed
+        super().__init__(num_bins)
+    
+    @profiling.instrument
+    def fit(self, data):
+        """
+        Calculates the cut points of every numeric column of the data, forgetting any previous fit. Without rank_error they are exact and only the cut 
+        points are kept.
+        
+        Parameters
+        ----------
+        data (list, np.array, pandas.DataFrame): The data used to calculate the cut points.
+        
+        Returns
+        -------
+        The discretizer itself.
+        """
+        self._reset()
+        if self.rank_error is not None:
+            return(self.partial_fit(data))
+        data = data2df(data)
+        for name in data.columns:
+            if is_numeric_kind(data[name].dtype):
+                self.cut_points_[name] = cut_points_EF(numeric_values(data[name]), self.num_bins)
+        return(self)
+    
+    def _reset(self):
+        super()._reset()
+        self._sketches = {}
+    
+    def _new_sketch(self):
+        return(KLLSketch.from_rank_error(self.rank_error or self.partial_rank_error, self.seed))
+    
+    def _update(self, name, x):
+        if name not in self._sketches:
+            if name in self.cut_points_:
+                raise ValueError(f"The exact cut points of column {name} were calculated with fit and cannot be updated. Use partial_fit for all the chunks.")
+            self._sketches[name] = self._new_sketch()
+        self._set_sketch_cut_points(name, self._sketches[name].update(x))
+    
+    def _merge(self, name, other):
+        if name not in other._sketches or (name in self.cut_points_ and name not in self._sketches):
+            raise ValueError(f"The exact cut points of column {name} were calculated with fit and cannot be merged. Use partial_fit to fit the workers.")
+        if name not in self._sketches:
+            self._sketches[name] = self._new_sketch()
+        self._set_sketch_cut_points(name, self._sketches[name].merge(other._sketches[name]))
+    
+    def _set_sketch_cut_points(self, name, sketch):
+        """Same positions as cut_points_EF, read from the sketch."""
+        freq = max(round(sketch.n/self.num_bins), 1)
+        self.cut_points_[name] = sketch.quantile(np.arange(freq, sketch.n, freq)/sketch.n)
+
+_discretizer_classes = {"EW": EqualWidthDiscretizer, "EF": EqualFrequencyDiscretizer}
+
+def _discretize_dataset(dataset, num_bins, disc_alg):
+    """
+    Cut points of the columns of a MemmapDataset and a generator of its discretized row blocks. EW reads the row blocks once to get the minimums and 
+    maximums. The exact EF cut points need whole columns, which are read by groups that fit in the block size of the dataset.
+    """
+    disc = _discretizer_classes[disc_alg](num_bins)
+    if disc_alg == "EW":
+        for block in dataset.iter_blocks():
+            disc.partial_fit(block)
+    else:
+        for group in dataset.iter_column_groups():
+            for name in group.columns:
+                disc.cut_points_[name] = cut_points_EF(group[name].to_numpy(), num_bins)
+    cut_pts = [disc.cut_points_[name] for name in dataset.names]
+    return((disc.transform(block) for block in dataset.iter_blocks()), cut_pts)
@@ -1,6 +1,10 @@
 from datalib.utils import *
+from datalib import profiling
+from datalib.dataset import MemmapDataset, save_npy
 import numpy as np
 import pandas as pd
+import json
+import warnings
 
 def normalize(x):
     """
@@ -14,7 +18,8 @@ def normalize(x):
     -------
     x_norm (numpy.array or pandas.Series): The normalized vector.
     """
-    x_norm = (x-min(x))/ (max(x)-min(x))
+    x_min = np.min(x)
+    x_norm = (x-x_min)/ (np.max(x)-x_min)
     return x_norm
 
 def standarize(x):
@@ -33,31 +38,270 @@ def standarize(x):
     x_stand = (x-np.mean(x))/np.std(x)
     return x_stand
 
-def feature_scaling (data, operation="normalize"):
+class _Scaler:
+    """Common part of the scalers: each one keeps a shift and a scale per column, and transforms the data as (x-shift)/scale."""
+    
+    kind = None
+    
+    def __init__(self):
+        self._reset()
+    
+    def fit(self, data):
+        """
+        Calculates the parameters of every column of the data, forgetting any previous fit.
+        
+        Parameters
+        ----------
+        data (list, matrix, numpy.array or pandas.DataFrame): Numeric data.
+        
+        Returns
+        -------
+        The scaler itself.
+        """
+        self._reset()
+        return(self.partial_fit(data))
+    
+    @profiling.instrument
+    def partial_fit(self, data, block_rows=65536):
+        """
+        Updates the parameters with a new chunk of data, so they are calculated from all the chunks seen so far.
+        
+        Parameters
+        ----------
+        data (list, matrix, numpy.array or pandas.DataFrame): Chunk of numeric data with the same columns as the previous ones.
+        block_rows (int): The statistics are calculated for blocks of block_rows rows at a time, so the temporary arrays are small. By default 65536.
+        
+        Returns
+        -------
+        The scaler itself.
+        """
+        data = data2df(data)
+        if self.columns_ is None:
+            self.columns_ = data.columns.tolist()
+        for start in range(0, len(data), block_rows):
+            self._update(numeric_values(data.iloc[start:start+block_rows], float))
+        return(self)
+    
+    @profiling.instrument
+    def transform(self, data, dtype="float64", inplace=False):
+        """
+        Scales the data with the fitted parameters.
+        
+        Parameters
+        ----------
+        data (list, matrix, numpy.array or pandas.DataFrame): Numeric data with the columns used to fit the scaler. The columns of a dataframe are 
+            selected by name, in the order of the fit, and a ValueError is raised if any of them is missing. Other data is scaled by position.
+        dtype (str or numpy.dtype): Floating point type of the result. "float32" halves the memory. By default "float64".
+        inplace (bool): If True and data is a numpy array of type dtype, the array is scaled in place. If data is a dataframe its columns are replaced by 
+            the scaled ones. By default False.
+        
+        Returns
+        -------
+        numpy.array or pandas.DataFrame: The scaled data, in the same format as the input (a dataframe for lists).
+        """
+        shift, scale = self._parameters()
+        if isinstance(data, pd.DataFrame): # the parameters of each column are applied by name
+            missing = [name for name in self.columns_ if name not in data.columns]
+            if missing:
+                raise ValueError(f"The data does not have the columns {missing} used to fit the scaler.")
+            frame = data if data.columns.tolist() == self.columns_ else data[self.columns_]
+        else:
+            frame = data2df(data) if not isinstance(data, np.ndarray) else data
+        if inplace and isinstance(data, np.ndarray) and data.dtype == np.dtype(dtype):
+            values = data
+        else:
+            values = frame
+            if isinstance(values, pd.DataFrame) and not all(isinstance(column_dtype, np.dtype) for column_dtype in values.dtypes):
+                values = numeric_values(values, dtype) # nullable types, with NaN for the missing values
+            values = np.array(values, dtype=dtype) # the only copy of the numpy types
+            profiling.note_copy(values.nbytes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values -= shift.astype(dtype)
+            values *= (1/scale).astype(dtype)
+        
+        if isinstance(data, np.ndarray):
+            return(values)
+        if inplace and isinstance(data, pd.DataFrame):
+            for i, name in enumerate(self.columns_):
+                data[name] = values[:, i]
+            return(data)
+        return(pd.DataFrame(values, columns=frame.columns, index=frame.index, copy=False))
+    
+    def fit_transform(self, data, dtype="float64", inplace=False):
+        """Fits the scaler and scales the same data. See fit and transform."""
+        return(self.fit(data).transform(data, dtype, inplace))
+    
+    def save(self, path):
+        """
+        Saves the fitted parameters in a numpy .npz file.
+        
+        Parameters
+        ----------
+        path (str): Path of the file.
+        """
+        meta = {"kind": self.kind, "columns": self.columns_}
+        np.savez(path, meta=np.array(json.dumps(meta)), **self._state())
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a scaler saved with save.
+        
+        Parameters
+        ----------
+        path (str): Path of the file.
+        
+        Returns
+        -------
+        The fitted scaler.
+        """
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            if cls.kind is not None and meta["kind"] != cls.kind:
+                raise ValueError(f"The file contains a {meta['kind']} scaler.")
+            scaler = _scaler_classes[meta["kind"]]()
+            scaler.columns_ = meta["columns"]
+            for name in f.files:
+                if name != "meta":
+                    setattr(scaler, name, f[name] if f[name].ndim else f[name].item())
+        return(scaler)
+
+class MinMaxScaler(_Scaler):
+    """
+    Scaler that normalizes each column to the range from 0 to 1, like normalize, and keeps the minimum and maximum of the columns to scale new data.
+    
+    Attributes
+    ----------
+    min_ (numpy.array): Minimum of each column.
+    max_ (numpy.array): Maximum of each column.
+    """
+    
+    kind = "normalize"
+    
+    def _reset(self):
+        self.columns_ = None
+        self.min_ = None
+        self.max_ = None
+    
+    def _update(self, x):
+        if len(x) == 0:
+            return
+        with warnings.catch_warnings(): # columns without values in the chunk give NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            x_min, x_max = np.nanmin(x, axis=0), np.nanmax(x, axis=0)
+        if self.min_ is None:
+            self.min_, self.max_ = x_min, x_max
+        else: # fmin and fmax keep the value of the other part when one of them is NaN
+            self.min_ = np.fmin(self.min_, x_min)
+            self.max_ = np.fmax(self.max_, x_max)
+    
+    def _parameters(self):
+        return(self.min_, self.max_-self.min_)
+    
+    def _state(self):
+        return({"min_": self.min_, "max_": self.max_})
+
+class StandardScaler(_Scaler):
+    """
+    Scaler that standarizes each column to mean 0 and standard deviation 1, like standarize, and keeps the mean and the variance of the columns to scale new data.
+    
+    The statistics of each chunk are combined with the ones of the previous chunks with the parallel algorithm of Chan et al., which gives the same result 
+    as computing them over all the data at once. Like standarize, the NaN values are skipped.
+    
+    Attributes
+    ----------
+    n_ (numpy.array): Number of values (not NaN) seen in each column.
+    mean_ (numpy.array): Mean of each column.
+    var_ (numpy.array): Population variance of each column.
+    """
+    
+    kind = "standarize"
+    
+    def _reset(self):
+        self.columns_ = None
+        self.n_ = None
+        self.mean_ = None
+        self.var_ = None
+    
+    def _update(self, x):
+        if len(x) == 0:
+            return
+        valid = ~np.isnan(x)
+        n = valid.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nansum(x, axis=0)/n
+            deviation = np.where(valid, x-mean, 0)
+            m2 = np.einsum("ij,ij->j", deviation, deviation)
+            if self.mean_ is None:
+                self.n_, self.mean_, self.var_ = n, mean, m2/n
+                return
+            total = self.n_ + n
+            delta = mean - self.mean_
+            merged_m2 = self.var_*self.n_ + m2 + delta**2*self.n_*n/total
+            merged_mean = self.mean_ + delta*n/total
+            var = m2/n
+            merged_var = merged_m2/total
+        # columns without values in one of the parts keep the moments of the other
+        self.var_ = np.where(n == 0, self.var_, np.where(self.n_ == 0, var, merged_var))
+        self.mean_ = np.where(n == 0, self.mean_, np.where(self.n_ == 0, mean, merged_mean))
+        self.n_ = total
+    
+    def _parameters(self):
+        return(self.mean_, np.sqrt(self.var_))
+    
+    def _state(self):
+        return({"n_": np.array(self.n_), "mean_": self.mean_, "var_": self.var_})
+
+_scaler_classes = {"normalize": MinMaxScaler, "standarize": StandardScaler}
+
+@profiling.instrument
+def feature_scaling (data, operation="normalize", output=None):
     """
     This function calculates the metrics for the input data acording to its type; entropy if the variable is discrete, variance if it is continuous and AUC if the data is continuous 
     with a boolean variable.
     
     Parameters
     ----------
-    data (list, matrix, numpy.array or pandas.DataFrame): Data to be normalized or standarized.
+    data (list, matrix, numpy.array, pandas.DataFrame or MemmapDataset): Data to be normalized or standarized.
     operation (str): The type of feature scaling to be performed. The options are "normalize" or "satandarize". By default the function will normalize the data.
+    output (str, optional): Only for a MemmapDataset. Path of a .npy file where the scaled data is written block by block. By default a generator of the 
+        scaled row blocks is returned instead.
     
     Returns
     -------
-    data_new (pandas.DataFrame): Normalized or standarized data.
+    data_new (pandas.DataFrame, MemmapDataset or generator): Normalized or standarized data. For a MemmapDataset, the dataset of the output file or a 
+        generator of the scaled row blocks.
+    
+    Notes
+    -----
+    The statistics of all the columns are calculated at once with MinMaxScaler or StandardScaler, and the data is copied only once, into the result.
     """
     
+    if isinstance(data, MemmapDataset) and operation in ("normalize", "satandarize"):
+        profiling.note_path(operation)
+        scaler = MinMaxScaler() if operation == "normalize" else StandardScaler()
+        for block in data.iter_blocks():
+            scaler.partial_fit(block)
+        blocks = (scaler.transform(block) for block in data.iter_blocks())
+        if output is None:
+            return(blocks)
+        return(save_npy(blocks, output, len(data), data.names, "float64"))
+    
     try:
-        data_new = data2df(data).copy()
+        data_new = data2df(data)
     except:
         return(None)
+    if data_new is None:
+        return(None)
     
     if is_num(data_new):
+        profiling.note_path(operation)
         if operation =="normalize":
-            data_new = data_new.apply(normalize, axis=0)
+            data_new = MinMaxScaler().fit_transform(data_new)
         elif operation =="satandarize":
-            data_new = data_new.apply(standarize, axis=0)
+            data_new = StandardScaler().fit_transform(data_new)
+        else: # unknown operation, the data is returned unchanged but never the input itself
+            data_new = data_new.copy()
         return(data_new)
     else:
         print("The input data is not numeric")
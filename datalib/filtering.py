@@ -1,6 +1,10 @@
 from datalib.utils import *
+from datalib import profiling
 import numpy as np
 import pandas as pd
+from functools import lru_cache
+
+_ops = {"<": (lambda x,y: x<y), ">": (lambda x,y: x>y),"<=": (lambda x,y: x<=y), ">=": (lambda x,y: x>=y), "==": (lambda x,y: x==y), "!=": (lambda x,y: x!=y)}
 
 def filter_each_condition (data, var, condition, th_value, new_val=None):
     """
@@ -19,17 +23,136 @@ def filter_each_condition (data, var, condition, th_value, new_val=None):
     data (pandas.DataFrame): The modified data.
     """
     
-    ops = {"<": (lambda x,y: x<y), ">": (lambda x,y: x>y),"<=": (lambda x,y: x<=y), ">=": (lambda x,y: x>=y), "==": (lambda x,y: x==y), "!=": (lambda x,y: x!=y)}
-    
     if new_val:
-        data.loc[ops[condition](data[var], th_value), var] = new_val
+        data.loc[_ops[condition](data[var], th_value), var] = new_val
         
     elif not new_val:
-        data = data.loc[ops[condition](data[var], th_value)].reset_index(drop=True)
+        data = data.loc[_ops[condition](data[var], th_value)].reset_index(drop=True)
           
     return(data)
 
-def filter_condition_list (data, condition_list):
+def _parse_value(value):
+    """Converts the new value of a modification to int or float when possible."""
+    for number in (int, float):
+        try:
+            return(number(value))
+        except ValueError:
+            pass
+    return(value)
+
+@lru_cache(maxsize=256)
+def _compile(conditions):
+    steps = []
+    for i, condition in enumerate(conditions):
+        expression, *new_val = condition.split(",")
+        groups = [[comparison.split() for comparison in group.split("&")] for group in expression.split("|")]
+        if len(new_val)>1 or not all(len(comparison)==3 and comparison[1] in _ops for group in groups for comparison in group):
+            steps.append((i, None, None))
+            continue
+        try:
+            groups = tuple(tuple((var, op, float(th_value)) for var, op, th_value in group) for group in groups)
+        except ValueError:
+            steps.append((i, None, None))
+            continue
+        new_val = _parse_value(new_val[0].strip()) if new_val else None
+        steps.append((i, groups, new_val))
+    return(tuple(steps))
+
+def compile_conditions (condition_list):
+    """
+    This function parses a list of conditions once and returns them in the format used by apply_conditions. The result is cached by the text of the conditions, 
+    so compiling the same list again does not parse it.
+    
+    Each condition will have to be in the following format:
+        -For filtering: "variable logic_operator threshold" 
+            ex.: "AUC != 0.8"
+        -For modification: "variable_to_be_modified logic_operator threshold, new_value" 
+            ex.: "entropy <= 2, 3"
+    Several comparisons can be grouped in the same condition with "&" (and) and "|" (or). "&" is applied first.
+            ex.: "AUC > 0.8 & entropy < 2 | variance > 1"
+    The rows are kept if they fulfill all the filtering conditions of the list.
+    
+    Parameters
+    ----------
+    condition_list (list): A list with all the conditions to apply.
+    
+    Returns
+    -------
+    tuple : The compiled conditions. A condition with a wrong format is kept as (index, None, None) so that it can be reported.
+    """
+    return(_compile(tuple(condition_list)))
+
+@profiling.instrument
+def apply_conditions (data, compiled, inplace=False):
+    """
+    This function filters/modifies a dataframe with conditions compiled by compile_conditions.
+    
+    All the conditions are evaluated in one pass over the columns they use and combined in a single mask, so the data is filtered only once at the end. 
+    The modifications are written on the working copy of the column they change, and later conditions see the modified values.
+    
+    Parameters
+    ----------
+    data (pandas.DataFrame): Data to be modified.
+    compiled (tuple): Conditions returned by compile_conditions.
+    inplace (bool): If True the input dataframe is modified and filtered instead of returning a new one. By default False.
+    
+    Returns
+    -------
+    data_new (pandas.DataFrame): The modified data.
+    """
+    keep = None
+    columns = {}
+    
+    def column(var):
+        return(columns[var] if var in columns else data[var].to_numpy())
+    
+    for i, groups, new_val in compiled:
+        if groups is None:
+            print(f"There is something wrong with the format of condition number {i+1} so it won't be applyed.")
+            continue
+        if not all(var in data.columns for group in groups for var, op, th_value in group):
+            print(f"La variable que se quiere editar con la condición {i+1} no sé encuentra en el dataset")
+            continue
+        
+        try:
+            mask = None
+            for group in groups:
+                group_mask = None
+                for var, op, th_value in group:
+                    m = np.asarray(_ops[op](column(var), th_value), dtype=bool)
+                    if m.shape != (len(data),):
+                        raise TypeError(f"The comparison of {var} does not give a value per row.")
+                    group_mask = m if group_mask is None else group_mask & m
+                mask = group_mask if mask is None else mask | group_mask
+            
+            if new_val is not None:
+                var = groups[0][0][0]
+                columns[var] = np.where(mask, new_val, column(var))
+        except Exception: # like the baseline, a condition that cannot be applied is skipped and the rest are still applied
+            print(f"La variable que se quiere editar con la condición {i+1} no sé encuentra en el dataset")
+            continue
+        if new_val is None:
+            keep = mask if keep is None else keep & mask
+    
+    if inplace:
+        profiling.note_path("inplace")
+        for var, values in columns.items():
+            data[var] = values
+        if keep is not None:
+            data.drop(index=data.index[~keep], inplace=True)
+            data.reset_index(drop=True, inplace=True)
+        return(data)
+    
+    profiling.note_path("copy")
+    data_new = data.loc[keep].reset_index(drop=True) if keep is not None else data.copy(deep=False)
+    if keep is not None:
+        profiling.note_copy(data_new.memory_usage(index=False).sum())
+    for var, values in columns.items():
+        data_new[var] = values[keep] if keep is not None else values
+    return(data_new)
+
+@profiling.instrument
+def filter_condition_list (data, condition_list, inplace=False):
     """
     This function takes data and filters/modifies it considering the conditions given in condition_list. 
     
@@ -38,33 +161,99 @@ def filter_condition_list (data, condition_list):
             ex.: "AUC != 0.8"
         -For modification: "variable_to_be_modified logic_operator threshold, new_value" 
             ex.: "entropy <= 2, 3"
+    Several comparisons can be grouped in a filtering condition with "&" (and) and "|" (or), see compile_conditions.
     
     Parameters
     ----------
     data (list, matrix, numpy.array or pandas.DataFrame): Data to be modified.
     condition_list (list): A list with all the conditions to apply.
+    inplace (bool): If True and data is a dataframe, it is modified and filtered in place. By default False.
     
     Returns
     -------
     data_new (pandas.DataFrame): The modified data.
+    
+    Notes
+    -----
+    The conditions are compiled once (and cached by their text) and applied in a single pass with apply_conditions, instead of filtering and copying the data 
+    once per condition.
     """
     
     try:
-        data_new = data2df(data).copy()
+        data_new = data2df(data)
     except:
         return(None)
+    if data_new is None:
+        return(None)
     
-    condition_list = [condition.replace(",", "").split() for condition in condition_list]
-    condition_list = [condition+[None] if len(condition)==3 else condition for condition in condition_list]
+    return(apply_conditions(data_new, compile_conditions(condition_list), inplace=inplace and data_new is data))
+
+def filter_chunks (source, condition_list, chunksize=100000, prefetch_chunks=2):
+    """
+    This function filters/modifies data by chunks, so that files larger than memory can be processed. The conditions are compiled once and applied to each 
+    chunk as it is read, and the next chunks are read in a background thread while the current one is filtered.
     
-    for i, cond in enumerate(condition_list):
-        if not len(cond)==4:
-            print(f"There is something wrong with the format of condition number {i+1} so it won't be applyed.")
-        else:
-            var, condition, th_value, new_val = cond
-            try:
-                data_new[var]
-                data_new = filter_each_condition (data_new, var, condition, float(th_value), new_val)
-            except:
-                print(f"La variable que se quiere editar con la condición {i+1} no sé encuentra en el dataset")
-    return(data_new)
+    Parameters
+    ----------
+    source (str, pandas.DataFrame or iterable): Path of a CSV or Parquet file, a dataframe or an iterable of chunks. See utils.iter_chunks.
+    condition_list (list): A list with all the conditions to apply, in the format of filter_condition_list.
+    chunksize (int): Number of rows read at a time when source is a file or a dataframe. By default 100000.
+    prefetch_chunks (int): Number of chunks read in advance. 0 reads them only when they are needed. By default 2.
+    
+    Returns
+    -------
+    generator : The filtered chunks as pandas Dataframes. The rows are numbered consecutively across chunks.
+    """
+    compiled = compile_conditions(condition_list)
+    chunks = iter_chunks(source, chunksize)
+    if prefetch_chunks > 0:
+        chunks = prefetch(chunks, prefetch_chunks)
+    
+    offset = 0
+    for chunk in chunks:
+        chunk = apply_conditions(chunk, compiled)
+        chunk.index = pd.RangeIndex(offset, offset+len(chunk))
+        offset += len(chunk)
+        yield(chunk)
+
+@profiling.instrument
+def filter_to_file (source, output, condition_list, chunksize=100000, prefetch_chunks=2):
+    """
+    This function filters/modifies data by chunks with filter_chunks and writes each filtered chunk to a file as soon as it is ready, so the memory used is bounded 
+    by the size of the chunks.
+    
+    Parameters
+    ----------
+    source (str, pandas.DataFrame or iterable): Path of a CSV or Parquet file, a dataframe or an iterable of chunks. See utils.iter_chunks.
+    output (str): Path of the output file. It will be a Parquet file if the extension is .parquet or .pq (requires pyarrow) and a CSV file otherwise.
+    condition_list (list): A list with all the conditions to apply, in the format of filter_condition_list.
+    chunksize (int): Number of rows read at a time when source is a file or a dataframe. By default 100000.
+    prefetch_chunks (int): Number of chunks read in advance. By default 2.
+    
+    Returns
+    -------
+    int : Number of rows written.
+    """
+    n_rows = 0
+    writer = None
+    parquet = str(output).endswith((".parquet", ".pq"))
+    if parquet:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet files requires pyarrow. Install it with: pip install pyarrow")
+    try:
+        for i, chunk in enumerate(filter_chunks(source, condition_list, chunksize, prefetch_chunks)):
+            if parquet:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(output, mode="w" if i==0 else "a", header=i==0, index=False)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return(n_rows)
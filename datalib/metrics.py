@@ -1,8 +1,14 @@
 from datalib.utils import *
+from datalib import profiling
+from datalib.sketches import EntropySketch, HyperLogLog
+from datalib.dataset import MemmapDataset
 import numpy as np
 import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-def entropy(x, normalize=False):
+@profiling.instrument
+def entropy(x, normalize=False, approx=False):
     """
     Calculates the entropy of the discrete vecor x.
     
@@ -11,8 +17,10 @@ def entropy(x, normalize=False):
     
     Parameters
     ----------
-    x (list, np. array or pandas.DataFrame): Vector of values.
+    x (list, np. array, pandas.Series or pandas.Categorical): Vector of values.
     normalize (bool): If True the entropy will be normalized, if false it will not. By default the entropy will not be normalized.
+    approx (bool): If True the entropy is estimated with sketches.EntropySketch (and the number of levels for the normalization with sketches.HyperLogLog), 
+        which use a fixed amount of memory whatever the number of levels. By default False.
     
     Returns
     -------
@@ -21,20 +29,60 @@ def entropy(x, normalize=False):
     Notes
     -----
     The logarithm used is the natural logarithm (base-e).
+    The values are encoded as integer codes once and counted with a single bincount. The codes of categorical data are used directly, and all its categories 
+    count as levels for the normalization.
+    Missing values are not counted as a level, but the probabilities are still divided by the length of x.
     """
-    if isinstance(x, pd.Categorical):
-        levels = x.categories
+    if approx:
+        profiling.note_path("approx")
+        values = pd.Series(np.asarray(x))
+        values = values[values.notna()]
+        H = EntropySketch().update(values).entropy() if len(values) else 0.0
+        n_levels = HyperLogLog().update(values).count() if normalize else 1
+        present = len(values)/len(x) if len(x) else 1.0
+        if 0 < present < 1: # the sketch estimates the entropy of the values present, scaled to probabilities over all of x
+            H = present*H - present*np.log(present)
     else:
-        levels = np.unique(x)
+        if isinstance(x, pd.Series) and isinstance(x.dtype, pd.CategoricalDtype):
+            x = x.array
+        if isinstance(x, pd.Categorical):
+            profiling.note_path("categorical")
+            n_levels = len(x.categories)
+            codes = x.codes
+        else:
+            profiling.note_path("factorize")
+            codes, n_levels = factorize(x)
+        counts = np.bincount(codes[codes >= 0], minlength=n_levels)
         
-    prob = np.array([np.count_nonzero(x == level)/len(x) for level in levels])
-    prob = np.delete(prob, np.argwhere(prob == 0))
-    H = np.nansum(-prob*np.log(prob))
-    if normalize and H!=0 and len(levels)!=1:
-        return(H/np.log(len(levels)))
+        prob = counts[counts > 0]/len(x)
+        H = np.nansum(-prob*np.log(prob))
+    if normalize and H!=0 and n_levels>1:
+        return(H/np.log(n_levels))
     else:
         return(H)
 
+@profiling.instrument
+def entropy_columns(data, normalize=False, approx=False):
+    """
+    Calculates the entropy of every column of the data with entropy.
+    
+    Parameters
+    ----------
+    data (list, numpy.array or pandas.DataFrame): Discrete data, one variable per column.
+    normalize (bool): If True the entropies will be normalized. By default False.
+    approx (bool): If True the entropies are estimated with sketches. By default False.
+    
+    Returns
+    -------
+    pd.Series: The entropy of each column, named "Entropy".
+    """
+    data = data2df(data)
+    if data is None:
+        return(None)
+    e = pd.Series([entropy(data.iloc[:, i], normalize, approx) for i in range(data.shape[1])], index=data.columns, dtype=float)
+    e.name = "Entropy"
+    return(e)
+
 def variance(x, var_type = "population"):
     """This function calculates the variance of the continuous vector x. It will calculate the sample variance of the population variance depending the value of var_type.
     
@@ -63,7 +111,54 @@ def variance(x, var_type = "population"):
     
     return(np.sum((x - np.mean(x))**2) / n)
 
-def AUC (df, return_TPR_FPR = False):
+@profiling.instrument
+def ROC_curve(scores, labels):
+    """
+    Calculates the receiver operating characteristic (ROC) curve of a classifier by sorting the predictions once and accumulating the true and false 
+    positives with cumulative sums. There will be one point for each distinct prediction value, so tied predictions are handled as a single threshold.
+    
+    Parameters
+    ----------
+    scores (list, np.array or pandas.Series): Predictions of the classifier.
+    labels (list, np.array or pandas.Series): True labels, as booleans.
+    
+    Returns
+    -------
+    TPR (numpy.array): True positive rate for each threshold, in decreasing threshold order.
+    FPR (numpy.array): False positive rate for each threshold, in decreasing threshold order.
+    thresholds (numpy.array): Distinct prediction values used as thresholds, in decreasing order.
+    
+    Notes
+    -----
+    A prediction is considered positive when it is greater than or equal to the threshold. Missing (NaN) predictions are ignored. If there are no 
+    predictions left the function will return None.
+    """
+    scores = np.asarray(scores, dtype=float).ravel()
+    labels = np.asarray(labels, dtype=bool).ravel()
+    valid = ~np.isnan(scores)
+    if not valid.any():
+        print("There are no predictions to calculate the ROC curve.")
+        return(None)
+    thresholds, tps, fps = _roc_counts(scores[valid], labels[valid])
+    return(tps/tps[-1], fps/fps[-1], thresholds)
+
+def _roc_counts(scores, labels):
+    """Sorts the predictions in decreasing order and returns the distinct thresholds together with the cumulative true and false positive counts."""
+    order = np.argsort(scores, kind="mergesort")[::-1]
+    scores = scores[order]
+    last = np.r_[np.flatnonzero(np.diff(scores)), len(scores)-1] # last position of each group of tied predictions
+    tps = np.cumsum(labels[order])[last]
+    fps = (last+1) - tps
+    return(scores[last], tps, fps)
+
+def _auc_from_counts(tps, fps):
+    """Integrates the ROC curve given by the cumulative counts with the trapezoidal rule, so tied predictions of different classes count as one half."""
+    tpr = np.r_[0, tps/tps[-1]]
+    fpr = np.r_[0, fps/fps[-1]]
+    return(float(np.sum(np.diff(fpr)*(tpr[1:]+tpr[:-1]))/2))
+
+@profiling.instrument
+def AUC (df, return_TPR_FPR = False, labels = None):
     """
     Calculates the area under the curve (AUC) of the df dataframe.
     For that it will first calculate the receiver operating characteristic (ROC) curve based on the data in the input dataframe, df.
@@ -73,11 +168,14 @@ def AUC (df, return_TPR_FPR = False):
     
     Parameters
     ----------
-    df (pandas.DataFrame): The dataframe containing the probabilities and labels of the classifier to be evaluated.
+    df (pandas.DataFrame or array-like): The dataframe containing the probabilities and labels of the classifier to be evaluated. If labels is given, df is 
+        the vector of predicted probabilities instead (list, numpy.array or pandas.Series).
     
     return_TPR_FPR (bool, optional): Determines whether the function returns only the AUC or also the true positive rate (TPR) and false positive rate (FPR) arrays 
         used to calculate the AUC. Defaults to False.
     
+    labels (array-like, optional): Vector of boolean true labels. Use it to pass raw arrays instead of a dataframe.
+    
     Returns
     -------
     tuple: If return_TPR_FPR is True, returns a tuple containing the AUC and the TPR and FPR arrays. If return_TPR_FPR is False, returns only the AUC.
@@ -87,55 +185,276 @@ def AUC (df, return_TPR_FPR = False):
     - The input dataframe, df, should contain a single column of boolean values representing the true labels and a single column of continuous values between 0 and 1 
        representing the predicted probabilities. If this conditions are not fullfilled the function will return None.
     - If the continuous values in df are not probabilities between 0 and 1 the function will also return None.
+    - The predictions are sorted only once, so the cost is O(n log n). Ties between a positive and a negative prediction count as one half.
+    - Missing (NaN) predictions and their labels are ignored.
+    - The TPR and FPR lists have one value per prediction, in increasing order of the prediction used as threshold.
     """
     
-    labels = df.select_dtypes(include=[bool])
-    val = df.select_dtypes(exclude=[bool])
-    [val_index] = val.columns.tolist()
-    [lab_index] = labels.columns.tolist()
-    
-    if len(labels.columns)>1:
-        print("There is more than one boolean variable.")
-        return(None)
-    if len(val.columns)>1:
-        print("There is more than one predictions variable.")
+    if labels is None:
+        profiling.note_path("dataframe")
+        boolean = (infer_schema(df) == BOOLEAN).to_numpy()
+        lab = df.loc[:, boolean]
+        val = df.loc[:, ~boolean]
+        
+        if len(lab.columns)>1:
+            print("There is more than one boolean variable.")
+            return(None)
+        if len(val.columns)>1:
+            print("There is more than one predictions variable.")
+            return(None)
+        scores = val.iloc[:,0].to_numpy(dtype=float, na_value=np.nan)
+        labels = lab.iloc[:,0].to_numpy(dtype=bool)
+    else:
+        profiling.note_path("arrays")
+        scores = np.asarray(df, dtype=float).ravel()
+        labels = np.asarray(labels, dtype=bool).ravel()
+    valid = ~np.isnan(scores) # missing predictions are ignored, like in batch_AUC
+    if not valid.all():
+        scores, labels = scores[valid], labels[valid]
+    if len(scores)==0:
+        print("There are no predictions to calculate the AUC.")
         return(None)
-    if float(val.max())>1 or float(val.min())<0:
+    
+    if scores.max()>1 or scores.min()<0:
         print("The predictions should be probabilityes between 0 and 1. This condition is not fullfilled. please check the input.")
         return(None)
     
+    thresholds, tps, fps = _roc_counts(scores, labels)
+    if tps[-1]==0 or fps[-1]==0:
+        print("Both classes must be present in the labels to calculate the AUC.")
+        return(None)
     
-    df = df.sort_values(by= [val_index])
-    df["aux"]= True
-    
-    TPR_lis= []
-    FPR_lis= []
+    AUC = _auc_from_counts(tps, fps)
     
-    for v_corte in df[val_index]:
+    if return_TPR_FPR:
+        # one value per prediction, from the lowest threshold to the highest
+        repeats = np.diff(np.r_[0, tps+fps])[::-1]
+        TPR_lis = np.repeat(tps[::-1]/tps[-1], repeats).tolist()
+        FPR_lis = np.repeat(fps[::-1]/fps[-1], repeats).tolist()
+        return(AUC, TPR_lis, FPR_lis)
+    else:
+        return(AUC)
 
-        df.loc[df[val_index] <v_corte, "aux"] = False
+class StreamingAUC:
+    """
+    Accumulates the ROC curve and the AUC of a classifier whose predictions arrive in chunks.
+    
+    The predictions are counted in a fixed number of equal width bins between 0 and 1, one histogram for the positives and one for the negatives, so the 
+    memory does not depend on the number of predictions seen. Two accumulators with the same number of bins can be merged, which allows computing the 
+    partial results in different workers.
+    
+    Parameters
+    ----------
+    n_bins (int): Number of bins of the histograms. More bins give a smaller approximation error. By default 10000.
+    
+    Notes
+    -----
+    Predictions that fall in the same bin are treated as ties, which is the only source of error with respect to the exact AUC. The maximum error is given 
+    by error_bound().
+    """
+    
+    def __init__(self, n_bins=10000):
+        self.n_bins = n_bins
+        self.pos = np.zeros(n_bins, dtype=np.int64)
+        self.neg = np.zeros(n_bins, dtype=np.int64)
+    
+    @profiling.instrument
+    def update(self, scores, labels):
+        """
+        Adds a chunk of predictions to the accumulator.
+        
+        Parameters
+        ----------
+        scores (list, np.array or pandas.Series): Predicted probabilities, between 0 and 1. Missing (NaN) predictions are ignored.
+        labels (list, np.array or pandas.Series): True labels, as booleans.
+        
+        Returns
+        -------
+        StreamingAUC: The accumulator itself.
+        """
+        scores = np.asarray(scores, dtype=float).ravel()
+        labels = np.asarray(labels, dtype=bool).ravel()
+        valid = ~np.isnan(scores) # missing predictions are ignored, like in AUC
+        if not valid.all():
+            scores, labels = scores[valid], labels[valid]
+        if len(scores) == 0:
+            return(self)
+        if scores.max()>1 or scores.min()<0:
+            print("The predictions should be probabilityes between 0 and 1. This condition is not fullfilled so the chunk won't be added.")
+            return(self)
+        
+        bins = np.minimum((scores*self.n_bins).astype(np.int64), self.n_bins-1)
+        self.pos += np.bincount(bins[labels], minlength=self.n_bins)
+        self.neg += np.bincount(bins[~labels], minlength=self.n_bins)
+        return(self)
+    
+    def merge(self, other):
+        """
+        Adds the counts of another accumulator to this one.
+        
+        Parameters
+        ----------
+        other (StreamingAUC): Accumulator with the same number of bins.
+        
+        Returns
+        -------
+        StreamingAUC: The accumulator itself.
+        """
+        if other.n_bins != self.n_bins:
+            raise ValueError("Only accumulators with the same number of bins can be merged.")
+        self.pos += other.pos
+        self.neg += other.neg
+        return(self)
+    
+    def result(self, return_TPR_FPR = False):
+        """
+        Calculates the AUC of all the predictions added so far.
+        
+        Parameters
+        ----------
+        return_TPR_FPR (bool, optional): Determines whether the function returns only the AUC or also the true positive rate (TPR) and false positive rate (FPR) 
+            arrays, one value per non empty bin in increasing order of the threshold. Defaults to False.
+        
+        Returns
+        -------
+        float or tuple: The AUC, or a tuple with the AUC and the TPR and FPR arrays. None if one of the classes has not been seen yet.
+        """
+        used = (self.pos+self.neg) > 0
+        tps = np.cumsum(self.pos[used][::-1])
+        fps = np.cumsum(self.neg[used][::-1])
+        if len(tps)==0 or tps[-1]==0 or fps[-1]==0:
+            print("Both classes must be present in the labels to calculate the AUC.")
+            return(None)
+        
+        AUC = _auc_from_counts(tps, fps)
+        if return_TPR_FPR:
+            return(AUC, tps[::-1]/tps[-1], fps[::-1]/fps[-1])
+        else:
+            return(AUC)
+    
+    def error_bound(self):
+        """
+        Returns the maximum absolute difference between result() and the AUC that the exact function AUC would return for the same predictions.
         
-        TP = sum([1 if (df["aux"].iloc[i] and df[lab_index].iloc[i]) else 0 for i in range (len(df))])
-        FP = sum([1 if (df["aux"].iloc[i] and not df[lab_index].iloc[i]) else 0 for i in range (len(df))])
-        TN = sum([1 if (not df["aux"].iloc[i] and not df[lab_index].iloc[i]) else 0 for i in range (len(df))])
-        FN = sum([1 if (not df["aux"].iloc[i] and df[lab_index].iloc[i]) else 0 for i in range (len(df))])
+        Pairs of a positive and a negative prediction in the same bin count as one half, while their exact contribution is 0, 1/2 or 1.
+        
+        Returns
+        -------
+        float: Upper bound of the approximation error.
+        """
+        n_pairs = self.pos.sum()*self.neg.sum()
+        if n_pairs == 0:
+            return(np.nan)
+        return(float(np.dot(self.pos, self.neg))/(2*n_pairs))
 
-        TPR = TP/(TP + FN)
-        FPR = FP/(FP + TN)
+def _grouped_auc(scores, labels, groups, n_groups, return_ROC=False):
+    """
+    AUC of the predictions of each group, from the average ranks of the predictions inside their group (Mann-Whitney statistic), with a single sort 
+    by group and prediction. Missing predictions are ignored. Optionally the ROC curve of each group, from the cumulative counts inside each group.
+    
+    Returns the AUC, number of predictions and number of positives of each group, and the groups, thresholds, TPR and FPR of the ROC curves.
+    """
+    valid = ~np.isnan(scores)
+    if not valid.all():
+        scores, labels, groups = scores[valid], labels[valid], groups[valid]
+    order = np.lexsort((scores, groups))
+    s, g, y = scores[order], groups[order], labels[order]
+    n = len(s)
+    
+    counts = np.bincount(g, minlength=n_groups)
+    pos = np.bincount(g, weights=y, minlength=n_groups)
+    neg = counts - pos
+    group_start = np.r_[0, np.cumsum(counts)[:-1]]
+    
+    # tied predictions of the same group get the average of their ranks inside the group
+    starts = np.flatnonzero(np.r_[True, (np.diff(s) != 0) | (np.diff(g) != 0)])
+    ends = np.r_[starts[1:], n]
+    tie_group = g[starts]
+    avg_rank = (starts+ends+1)/2 - group_start[tie_group]
+    rank_sum = np.bincount(g, weights=np.repeat(avg_rank, ends-starts)*y, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = (rank_sum - pos*(pos+1)/2)/(pos*neg)
+    
+    roc = None
+    if return_ROC:
+        # positives and negatives with a prediction greater than or equal to each threshold, in decreasing threshold order inside each group
+        cum_pos = np.r_[0, np.cumsum(y)]
+        tps = pos[tie_group] - (cum_pos[starts] - cum_pos[group_start[tie_group]])
+        fps = (group_start[tie_group] + counts[tie_group] - starts) - tps
+        back = np.lexsort((-s[starts], tie_group))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roc = (tie_group[back], s[starts][back], (tps/pos[tie_group])[back], (fps/neg[tie_group])[back])
+    return(auc, counts, pos, roc)
 
-        TPR_lis.append(TPR)
-        FPR_lis.append(FPR)
+def _batch_AUC_model(scores, labels, groups, n_groups, return_ROC):
+    return(_grouped_auc(np.asarray(scores, dtype=float), labels, groups, n_groups, return_ROC))
 
-    aux = FPR_lis[1:]+[0]
-    steps = abs(np.subtract(FPR_lis,aux))
+@profiling.instrument
+def batch_AUC(data, label, scores=None, segment=None, return_ROC=False, n_jobs=1):
+    """
+    Calculates the AUC of many models (prediction columns) in many segments of the data at once, instead of calling AUC for each pair.
     
-    AUC = sum(TPR_lis*steps)
+    Parameters
+    ----------
+    data (pandas.DataFrame): Data with the true labels, the predictions of the models and the segment keys.
+    label (str): Name of the column of boolean true labels.
+    scores (list, optional): Names of the prediction columns, one per model. By default all the continuous columns except the label and the segments.
+    segment (str or list, optional): Name of the column, or list of columns, that define the segments. By default the whole data is one segment.
+    return_ROC (bool): If True the ROC curves are also returned. By default False.
+    n_jobs (int): Number of processes, each one evaluates different models. -1 uses all the CPUs. By default 1.
     
-    if return_TPR_FPR:
-        return(AUC,TPR_lis,FPR_lis)
+    Returns
+    -------
+    pd.DataFrame: One row per model and segment with the segment keys and the columns "model", "n" (number of predictions), "positives" and "AUC". 
+        The AUC is NaN for segments with only one class.
+    pd.DataFrame: Only if return_ROC is True. The ROC curves, with the segment keys and the columns "model", "threshold", "TPR" and "FPR", one row per 
+        distinct prediction of each model and segment, in decreasing threshold order like ROC_curve.
+    
+    Notes
+    -----
+    The segments are encoded once for all the models. The AUC of each model is the Mann-Whitney statistic, computed from the ranks of one sort by 
+    segment and prediction, with tied predictions counting as one half like AUC. Missing predictions are ignored. Unlike AUC, the predictions do not 
+    need to be probabilities.
+    """
+    if scores is None:
+        excluded = {label} | set([segment] if isinstance(segment, str) else segment or [])
+        schema = infer_schema(data)
+        scores = [name for name in data.columns if schema[name] == CONTINUOUS and name not in excluded]
+    labels = data[label].to_numpy(dtype=bool)
+    if segment is None:
+        groups = np.zeros(len(data), dtype=np.intp)
+        keys = None
     else:
-        return(AUC)
+        grouped = data.groupby(segment, sort=True, dropna=False, observed=True) # only the categories that appear
+        groups = grouped.ngroup().to_numpy(dtype=np.intp)
+        keys = grouped.size().index.to_frame(index=False)
+    n_groups = int(groups.max())+1 if len(groups) else 0
+    
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    profiling.note_path("serial" if n_jobs == 1 else "parallel")
+    columns = [data[name].to_numpy() for name in scores]
+    if n_jobs == 1 or len(scores) < 2:
+        results = [_batch_AUC_model(x, labels, groups, n_groups, return_ROC) for x in columns]
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            k = len(scores)
+            results = list(pool.map(_batch_AUC_model, columns, [labels]*k, [groups]*k, [n_groups]*k, [return_ROC]*k))
+    
+    tables = []
+    curves = []
+    for name, (auc, counts, pos, roc) in zip(scores, results):
+        table = pd.DataFrame({"model": name, "n": counts, "positives": pos.astype(np.int64), "AUC": auc})
+        tables.append(table if keys is None else pd.concat([keys, table], axis=1))
+        if return_ROC:
+            curve = pd.DataFrame({"model": name, "threshold": roc[1], "TPR": roc[2], "FPR": roc[3]})
+            curves.append(curve if keys is None else pd.concat([keys.iloc[roc[0]].reset_index(drop=True), curve], axis=1))
+    result = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=["model", "n", "positives", "AUC"])
+    if return_ROC:
+        return(result, pd.concat(curves, ignore_index=True) if curves else pd.DataFrame(columns=["model", "threshold", "TPR", "FPR"]))
+    return(result)
 
+@profiling.instrument
 def calc_metrics (data):
     """
     This function calculates the metrics for the input data acording to its type; entropy if the variable is discrete, variance if it is continuous and AUC if the data is continuous 
@@ -143,39 +462,212 @@ def calc_metrics (data):
     
     Parameters
     ----------
-    data (list, numpy.array or pandas.DataFrame): The data whose metrics are going to be calculated.
+    data (list, numpy.array, pandas.DataFrame or MemmapDataset): The data whose metrics are going to be calculated. A MemmapDataset is read by row 
+        blocks with calc_metrics_chunked, so the AUC is not calculated for it.
     
     Returns
     -------
     (int or pd.Series): The calculated metric according to the type of data.
     """
     
+    if isinstance(data, MemmapDataset):
+        profiling.note_path("dataset")
+        return(calc_metrics_chunked(data))
     try:
-        data_new = data2df(data).copy()
+        data_new = data2df(data) # only read, so no copy is needed
     except:
         return(None)
+    if data_new is None:
+        return(None)
     
-    if any(data_new.dtypes == 'bool') and is_cont(data_new.select_dtypes(exclude=[bool])): 
+    schema = infer_schema(data_new) # cached, the kind of each column
+    continuous = (schema == CONTINUOUS).to_numpy()
+    boolean = (schema == BOOLEAN).to_numpy()
+    
+    if boolean.any() and continuous.any() and (continuous | boolean).all(): 
+        profiling.note_path("AUC")
         return(AUC(data_new))
                                             
-    elif is_cont(data_new):                   
+    elif continuous.all():                   
+        profiling.note_path("variance")
         v = data_new.apply(variance, axis=0)
         v.name = "Variance"
         return(v)
     
-    elif not is_cont(data_new) and not any(data_new.dtypes == 'float64'): 
-        e = data_new.apply(entropy, axis=0)
-        e.name = "Entropy"
-        return(e)
+    elif not continuous.any(): 
+        profiling.note_path("entropy")
+        return(entropy_columns(data_new))
         
     else: # igual los datos son mixtos
-        met = []
-        data_new = np.transpose(data_new)
-        for row in data_new.values:
-            if row.dtype == 'float64':
-                met.append(variance(row))
-            else:
-                met.append(entropy(row))
-        met = pd.Series(met)
+        profiling.note_path("mixed")
+        met = [variance(data_new.iloc[:, i]) if continuous[i] else entropy(data_new.iloc[:, i]) for i in range(data_new.shape[1])]
+        met = pd.Series(met, index=data_new.columns)
         met.name = "Variance & Entropy"
         return(met)
+
+class ColumnStatistics:
+    """
+    Mergeable partial statistics of the columns of a dataset, used to calculate the metrics of calc_metrics by chunks.
+    
+    Continuous (float) columns keep their count, mean and sum of squared deviations, which are combined between chunks with the parallel algorithm of 
+    Chan et al. (Welford moments). The rest of the columns keep a table with the count of each value. Like variance, the moments skip the NaN values 
+    and the variance is divided by the number of rows.
+    
+    Attributes
+    ----------
+    columns (list): Names of the columns, in the order of the first chunk.
+    continuous (list): Names of the continuous columns.
+    """
+    
+    def __init__(self):
+        self.columns = None
+        self.continuous = None
+        self.n = 0
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.counts = {}
+    
+    @profiling.instrument
+    def update(self, chunk):
+        """
+        Adds a chunk of data to the statistics.
+        
+        Parameters
+        ----------
+        chunk (list, numpy.array or pandas.DataFrame): Chunk with the same columns as the previous ones.
+        
+        Returns
+        -------
+        ColumnStatistics: The statistics themselves.
+        """
+        chunk = data2df(chunk)
+        if self.columns is None:
+            self.columns = chunk.columns.tolist()
+            schema = infer_schema(chunk)
+            self.continuous = schema.index[schema == CONTINUOUS].tolist()
+        
+        x = chunk[self.continuous].to_numpy(dtype=float, na_value=np.nan)
+        if len(x):
+            count = (~np.isnan(x)).sum(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.nansum(x, axis=0)/count
+            m2 = np.nansum((x-mean)**2, axis=0)
+            self._merge_moments(len(x), count, mean, m2)
+        for name in self.columns:
+            if name not in self.continuous:
+                self._merge_counts(name, chunk[name].value_counts(dropna=False, sort=False))
+        return(self)
+    
+    def merge(self, other):
+        """
+        Adds the statistics of other chunks, for example the ones calculated by another worker.
+        
+        Parameters
+        ----------
+        other (ColumnStatistics): Statistics of the same columns.
+        
+        Returns
+        -------
+        ColumnStatistics: The statistics themselves.
+        """
+        if other.columns is None:
+            return(self)
+        if self.columns is None:
+            self.columns, self.continuous = other.columns, other.continuous
+        if other.n:
+            self._merge_moments(other.n, other.count, other.mean, other.m2)
+        for name, counts in other.counts.items():
+            self._merge_counts(name, counts)
+        return(self)
+    
+    def result(self):
+        """
+        Calculates the population variance of the continuous columns and the entropy of the rest, like calc_metrics.
+        
+        Returns
+        -------
+        pd.Series: The metric of each column, named "Variance", "Entropy" or "Variance & Entropy".
+        """
+        met = {}
+        for name in self.columns:
+            if name in self.continuous:
+                met[name] = self.m2[self.continuous.index(name)]/self.n if self.n else np.nan
+            else:
+                counts = self.counts[name].to_numpy(dtype=float)
+                prob = counts/counts.sum()
+                prob = prob[prob > 0]
+                met[name] = np.nansum(-prob*np.log(prob))
+        met = pd.Series(met, dtype=float)
+        if len(self.continuous) == len(self.columns):
+            met.name = "Variance"
+        elif len(self.continuous) == 0:
+            met.name = "Entropy"
+        else:
+            met.name = "Variance & Entropy"
+        return(met)
+    
+    def _merge_moments(self, n, count, mean, m2):
+        if self.n == 0:
+            self.n, self.count, self.mean, self.m2 = n, count, mean, m2
+            return
+        total = self.count + count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = mean - self.mean
+            merged_m2 = self.m2 + m2 + delta**2*self.count*count/total
+            merged_mean = self.mean + delta*count/total
+        # columns without values in one of the parts keep the moments of the other
+        self.m2 = np.where(count == 0, self.m2, np.where(self.count == 0, m2, merged_m2))
+        self.mean = np.where(count == 0, self.mean, np.where(self.count == 0, mean, merged_mean))
+        self.count = total
+        self.n += n
+    
+    def _merge_counts(self, name, counts):
+        if name in self.counts:
+            self.counts[name] = self.counts[name].add(counts, fill_value=0)
+        else:
+            self.counts[name] = counts
+
+def _chunk_statistics(chunk):
+    return(ColumnStatistics().update(chunk))
+
+@profiling.instrument
+def calc_metrics_chunked (source, chunksize=100000, n_jobs=1):
+    """
+    This function calculates the variance of the continuous columns and the entropy of the discrete ones, like calc_metrics, reading the data by chunks 
+    so that the whole table never has to be in memory.
+    
+    Parameters
+    ----------
+    source (str, pandas.DataFrame, MemmapDataset or iterable): Path of a CSV or Parquet file, a dataframe or an iterable of chunks. See utils.iter_chunks.
+        The row blocks of a MemmapDataset are used as chunks.
+    chunksize (int): Number of rows read at a time when source is a file or a dataframe. By default 100000.
+    n_jobs (int): Number of processes. Each process calculates the statistics of different chunks, which are then merged. -1 uses all the CPUs. By default 1.
+    
+    Returns
+    -------
+    pd.Series: The metric of each column, named "Variance", "Entropy" or "Variance & Entropy".
+    
+    Notes
+    -----
+    Boolean columns are treated as discrete, so the AUC is not calculated. Use StreamingAUC for that.
+    """
+    stats = ColumnStatistics()
+    chunks = iter_chunks(source, chunksize)
+    profiling.note_path("serial" if n_jobs == 1 else "parallel")
+    if n_jobs == 1:
+        for chunk in chunks:
+            stats.update(chunk)
+        return(stats.result())
+    
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    with ProcessPoolExecutor(n_jobs) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(_chunk_statistics, chunk))
+            if len(pending) >= 2*n_jobs: # bounds the chunks in memory
+                stats.merge(pending.pop(0).result())
+        for future in pending:
+            stats.merge(future.result())
+    return(stats.result())
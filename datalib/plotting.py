@@ -1,73 +1,206 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import os
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
 
-def plot_ROC (TPR, FPR, AUC=None):
+def _get_axes(ax, path, show, figsize=None, constrained_layout=False, current=True):
+    """
+    Axes to draw on and whether to show them: the given ones, a new figure outside pyplot when the plot is saved or not shown (nothing global is created,
+    so the figure is freed with its last reference), or the pyplot ones for the interactive use.
+    """
+    if show is None:
+        show = ax is None and path is None
+    if ax is not None:
+        return(ax, show)
+    if path is not None or not show:
+        return(Figure(figsize=figsize, constrained_layout=constrained_layout).add_subplot(), show)
+    import matplotlib.pyplot as plt
+    if current:
+        return(plt.gca(), show)
+    return(plt.subplots(1, 1, constrained_layout=constrained_layout, figsize=figsize)[1], show)
+
+def _finish(ax, path, show):
+    """Saves the figure of ax if there is a path and shows it with pyplot if asked."""
+    if path is not None:
+        ax.figure.savefig(path)
+    if show:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+def downsample_curve(x, y, max_points=1000):
+    """
+    Selects at most max_points points of a curve, evenly spaced along its length, so that the shape is kept where the curve changes fast. The first and
+    the last points are always kept.
+
+    Parameters
+    ----------
+    x (list or array): Horizontal coordinates of the points, in the order of the curve.
+    y (list or array): Vertical coordinates of the points.
+    max_points (int): Maximum number of points. By default 1000.
+
+    Returns
+    -------
+    x, y (numpy.array): Coordinates of the selected points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return(x, y)
+    length = np.r_[0, np.cumsum(np.hypot(np.diff(x), np.diff(y)))]
+    keep = np.unique(np.searchsorted(length, np.linspace(0, length[-1], max_points)))
+    keep[-1] = len(x)-1
+    return(x[keep], y[keep])
+
+def plot_ROC (TPR, FPR, AUC=None, ax=None, path=None, show=None, max_points=1000):
     """
     This function plots a receiver operating characteristic (ROC) curve and optionally displays the area under the curve (AUC).
-    
+
     Parameters
     ----------
     TPR (list or array): List or array of true positive rates at different thresholds.
     FPR (list or array): List or array of false positive rates at different thresholds. Must be the same length as TPR.
     AUC (float, optional): AUC value to be displayed on the plot.
-    
+    ax (matplotlib.axes.Axes, optional): Axes to draw on. By default the current pyplot axes, or a new figure if path is given.
+    path (str, optional): File where the figure is saved, for example a .png or .svg file. The figure is not created with pyplot, so it is not shown
+        and does not stay in memory.
+    show (bool, optional): Whether to call pyplot.show. By default only when neither ax nor path are given.
+    max_points (int): Curves with more points are downsampled with downsample_curve before drawing them. The points are marked only if there are
+        at most 100. By default 1000.
+
     Returns
     -------
-    None    
+    matplotlib.axes.Axes: The axes with the plot.
     """
-    
-    plt.plot(TPR,FPR,color = "slateblue", zorder=1)
-    plt.scatter(TPR,FPR, s=80, marker = "*", color = "darkorange", zorder=2)
-    plt.title("ROC curve")
-    plt.ylabel('TPR')
-    plt.xlabel('FPR')
+
+    ax, show = _get_axes(ax, path, show)
+    TPR, FPR = downsample_curve(TPR, FPR, max_points)
+    ax.plot(TPR,FPR,color = "slateblue", zorder=1)
+    if len(TPR) <= 100:
+        ax.scatter(TPR,FPR, s=80, marker = "*", color = "darkorange", zorder=2)
+    ax.set_title("ROC curve")
+    ax.set_ylabel('TPR')
+    ax.set_xlabel('FPR')
     if AUC:
-        plt.fill_between(TPR,FPR,color = "slateblue", step="pre", alpha=0.4, label="AUC = "+str(AUC))
-        plt.legend()
-    plt.show()
+        ax.fill_between(TPR,FPR,color = "slateblue", step="pre", alpha=0.4, label="AUC = "+str(AUC))
+        ax.legend()
+    _finish(ax, path, show)
+    return(ax)
 
-def plot_CM (corr_matrix):
+def _block_mean(values, max_size):
+    """Averages square blocks of a matrix so that it has at most max_size rows and columns. The last blocks can be smaller."""
+    step = -(-len(values)//max_size)
+    if step == 1:
+        return(values)
+    starts = np.arange(0, len(values), step)
+    sizes = np.diff(np.r_[starts, len(values)])
+    sums = np.add.reduceat(np.add.reduceat(values, starts, axis=0), starts, axis=1)
+    return(sums/np.outer(sizes, sizes))
+
+def plot_CM (corr_matrix, ax=None, path=None, show=None, max_labels=50, max_pixels=1000):
     """
     This function plots a correlation matrix for a given dataframe.
-    
+
     Parameters
     ----------
-    corr_matrix (pandas dataframe): Dataframe containing the correlations between pairs of variables.
-    
+    corr_matrix (pandas dataframe or numpy.array): Dataframe containing the correlations between pairs of variables.
+    ax (matplotlib.axes.Axes, optional): Axes to draw on. By default a new figure.
+    path (str, optional): File where the figure is saved, for example a .png or .svg file. The figure is not created with pyplot.
+    show (bool, optional): Whether to call pyplot.show. By default only when neither ax nor path are given.
+    max_labels (int): The names of the variables are written only if there are at most max_labels. Otherwise the axes have numeric ticks, as drawing
+        thousands of labels is slower than the matrix itself. By default 50.
+    max_pixels (int): Larger matrices are reduced to this size by averaging blocks of correlations before drawing them, as the figure cannot show more
+        detail. By default 1000.
+
     Returns
     -------
-    None    
+    matplotlib.axes.Axes: The axes with the plot.
+
+    Notes
+    -----
+    The matrix is drawn as one image, so large matrices (thousands of variables) are rendered in about the same time as small ones.
     """
-    var_names = corr_matrix.columns.tolist()
-    
-    fig, ax = plt.subplots(1, 1, constrained_layout=True, figsize=(10, 4))
-    
-    mat = ax.matshow(corr_matrix, cmap="inferno")    
-    fig.colorbar(mat)
-    
-    ax.set_xticks(range(len(var_names)))
-    ax.set_xticklabels(var_names, rotation=45)
+    var_names = corr_matrix.columns.tolist() if hasattr(corr_matrix, "columns") else [f"Var {i+1}" for i in range(len(corr_matrix))]
+    values = np.asarray(corr_matrix, dtype=np.float32)
+
+    ax, show = _get_axes(ax, path, show, figsize=(10, 4), constrained_layout=True, current=False)
+    n = len(values)
+    mat = ax.imshow(_block_mean(values, max_pixels), cmap="inferno", interpolation="nearest", extent=(-0.5, n-0.5, n-0.5, -0.5))
+    ax.figure.colorbar(mat, ax=ax)
+
+    if len(var_names) <= max_labels:
+        ax.set_xticks(range(len(var_names)))
+        ax.set_xticklabels(var_names, rotation=45)
+        ax.set_yticks(range(len(var_names)))
+        ax.set_yticklabels(var_names)
     ax.tick_params(axis="x",bottom=True, top=False, labelbottom=True, labeltop=False)
-    ax.set_yticks(range(len(var_names)))
-    ax.set_yticklabels(var_names)
-    
-    plt.title('Correlation Matrix')
-    plt.show()
 
-def plot_entropy (x):
+    ax.set_title('Correlation Matrix')
+    _finish(ax, path, show)
+    return(ax)
+
+def plot_entropy (x, ax=None, path=None, show=None):
     """
     Plots a bar chart of entropy values.
-    
+
     Parameters
     ----------
     x (list or array): List or array of entropy values to be plotted.
-    
+    ax (matplotlib.axes.Axes, optional): Axes to draw on. By default the current pyplot axes, or a new figure if path is given.
+    path (str, optional): File where the figure is saved, for example a .png or .svg file. The figure is not created with pyplot.
+    show (bool, optional): Whether to call pyplot.show. By default only when neither ax nor path are given.
+
     Returns
     -------
-    None 
+    matplotlib.axes.Axes: The axes with the plot.
     """
+    ax, show = _get_axes(ax, path, show)
     names= [f"Var {i+1}" for i in range(len(x))]
-    plt.bar(names,x,color = "slateblue")
-    plt.title("Entropy")
-    plt.ylabel('Value')
-    plt.show()
\ No newline at end of file
+    ax.bar(names,x,color = "slateblue")
+    ax.set_title("Entropy")
+    ax.set_ylabel('Value')
+    _finish(ax, path, show)
+    return(ax)
+
+_plot_functions = {"ROC": plot_ROC, "CM": plot_CM, "entropy": plot_entropy}
+_figures = {} # figures reused by the batches of each process
+
+def _render(jobs, figsize, dpi):
+    for kind, kwargs, path in jobs:
+        key = (kind, figsize, dpi)
+        if key not in _figures:
+            _figures[key] = Figure(figsize=figsize, dpi=dpi, constrained_layout=kind == "CM")
+        fig = _figures[key]
+        fig.clear()
+        _plot_functions[kind](ax=fig.add_subplot(), path=path, show=False, **kwargs)
+    return(len(jobs))
+
+def render_batch(jobs, n_jobs=1, figsize=(6.4, 4.8), dpi=100):
+    """
+    Renders many plots to files without pyplot, for example the ROC curves of hundreds of segments. Each process reuses one figure per kind of plot.
+
+    Parameters
+    ----------
+    jobs (list): One tuple (kind, kwargs, path) per plot. kind is "ROC", "CM" or "entropy", kwargs are the arguments of plot_ROC, plot_CM or
+        plot_entropy (without ax, path and show) and path is the output file. The format is given by its extension (.png, .svg, .pdf...).
+    n_jobs (int): Number of processes. -1 uses all the CPUs. By default 1.
+    figsize (tuple): Size of the figures in inches. By default (6.4, 4.8).
+    dpi (int): Resolution of the raster formats. By default 100.
+
+    Returns
+    -------
+    list: The paths of the rendered files.
+    """
+    jobs = list(jobs)
+    for kind, kwargs, path in jobs:
+        if kind not in _plot_functions:
+            raise ValueError(f"Unknown kind of plot {kind}. The options are: {', '.join(_plot_functions)}")
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if n_jobs == 1 or len(jobs) < 2:
+        _render(jobs, figsize, dpi)
+    else:
+        size = -(-len(jobs)//(4*n_jobs)) # a few batches per process, to balance them
+        batches = [jobs[i:i+size] for i in range(0, len(jobs), size)]
+        with ProcessPoolExecutor(n_jobs) as pool:
+            list(pool.map(_render, batches, [figsize]*len(batches), [dpi]*len(batches)))
+    return([path for kind, kwargs, path in jobs])
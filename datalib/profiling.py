@@ -0,0 +1,192 @@
+"""
+Opt-in instrumentation of the public functions of datalib.
+
+When profiling is enabled, every instrumented call records its wall time, the number of rows and columns of its first argument, the bytes copied and the
+code paths it took (for example which branch of calc_metrics ran). Enable it with the profile context manager or by setting the environment variable
+DATALIB_PROFILE=1 before importing datalib:
+
+    from datalib import profiling
+    with profiling.profile():
+        calc_metrics(data)
+    print(profiling.get_stats())
+
+When it is disabled the instrumented functions only check a flag before running, so the overhead is negligible.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_enabled = os.environ.get("DATALIB_PROFILE", "") not in ("", "0")
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_hooks = []
+
+def enable():
+    """Enables the recording of the instrumented calls."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    """Disables the recording of the instrumented calls. The recorded statistics are kept."""
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    """Returns True if the calls are being recorded."""
+    return(_enabled)
+
+@contextmanager
+def profile(reset=True):
+    """
+    Context manager that records the instrumented calls made inside it.
+
+    Parameters
+    ----------
+    reset (bool): If True the statistics recorded before are deleted when entering. By default True.
+    """
+    previous = _enabled
+    if reset:
+        reset_stats()
+    enable()
+    try:
+        yield
+    finally:
+        if not previous:
+            disable()
+
+def _shape(data):
+    """Number of rows and columns of the first argument of a call, when it has them."""
+    shape = getattr(data, "shape", None)
+    if shape is not None and len(shape) > 0:
+        return(shape[0], shape[1] if len(shape) > 1 else 1)
+    if isinstance(data, (list, tuple)):
+        return(len(data), len(data[0]) if len(data) and isinstance(data[0], (list, tuple)) else 1)
+    return(None, None)
+
+def instrument(func):
+    """
+    Decorator that records the calls of func when profiling is enabled. For methods the rows and columns are those of the first argument after self, 
+    and the calls are recorded with the name of the class of the object, so subclasses that share a method have separate records.
+
+    Parameters
+    ----------
+    func (callable): Function to instrument.
+
+    Returns
+    -------
+    callable: The instrumented function.
+    """
+    module = func.__module__.rsplit('.', 1)[-1]
+    name = f"{module}.{func.__qualname__}"
+    method = func.__code__.co_argcount > 0 and func.__code__.co_varnames[0] == "self"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return(func(*args, **kwargs))
+        if method: # the data is the argument after self, and the record is named after the class of the object, not the base class
+            data = args[1] if len(args) > 1 else next(iter(kwargs.values()), None)
+            record_name = f"{module}.{type(args[0]).__name__}.{func.__name__}"
+        else:
+            data = args[0] if args else None
+            record_name = name
+        rows, cols = _shape(data)
+        record = {"function": record_name, "rows": rows, "cols": cols, "bytes_copied": 0, "paths": []}
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            return(func(*args, **kwargs))
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            stack.pop()
+            _add(record)
+    return(wrapper)
+
+def note_path(path):
+    """
+    Records the code path taken by the instrumented call that is running, for example "EF" in discretize.
+
+    Parameters
+    ----------
+    path (str): Name of the code path.
+    """
+    if _enabled:
+        stack = getattr(_local, "stack", None)
+        if stack:
+            stack[-1]["paths"].append(path)
+
+def note_copy(nbytes):
+    """
+    Records that the instrumented call that is running copied nbytes bytes of data.
+
+    Parameters
+    ----------
+    nbytes (int): Number of bytes copied.
+    """
+    if _enabled:
+        stack = getattr(_local, "stack", None)
+        if stack:
+            stack[-1]["bytes_copied"] += int(nbytes)
+
+def _add(record):
+    with _lock:
+        stats = _stats.setdefault(record["function"], {"calls": 0, "seconds": 0.0, "rows": 0, "cols": 0, "bytes_copied": 0, "paths": {}})
+        stats["calls"] += 1
+        stats["seconds"] += record["seconds"]
+        stats["rows"] += record["rows"] or 0
+        stats["cols"] += record["cols"] or 0
+        stats["bytes_copied"] += record["bytes_copied"]
+        for path in record["paths"]:
+            stats["paths"][path] = stats["paths"].get(path, 0) + 1
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook(record)
+
+def get_stats():
+    """
+    Returns the statistics aggregated by function since the last reset.
+
+    Returns
+    -------
+    dict: For each function (as "module.function"), the number of calls, the total seconds, rows, columns and bytes copied, and the number of times each
+        code path was taken.
+    """
+    with _lock:
+        return({name: dict(stats, paths=dict(stats["paths"])) for name, stats in _stats.items()})
+
+def reset_stats():
+    """Deletes the recorded statistics."""
+    with _lock:
+        _stats.clear()
+
+def add_export_hook(hook):
+    """
+    Registers a function that will be called with the record of every instrumented call, for example to send it to a monitoring system.
+
+    Parameters
+    ----------
+    hook (callable): Function that gets a dictionary with the keys "function", "seconds", "rows", "cols", "bytes_copied" and "paths".
+    """
+    with _lock:
+        _hooks.append(hook)
+
+def remove_export_hook(hook):
+    """Unregisters a function registered with add_export_hook."""
+    with _lock:
+        _hooks.remove(hook)
+
+def export(path):
+    """
+    Saves the aggregated statistics in a JSON file.
+
+    Parameters
+    ----------
+    path (str): Path of the file.
+    """
+    with open(path, "w") as f:
+        json.dump(get_stats(), f, indent=1)
@@ -0,0 +1,220 @@
+"""
+Bootstrap confidence intervals of the AUC, the Pearson's correlation and the mutual information.
+
+Every replicate is represented by a vector of weights, the number of times each observation is drawn, and the statistics are calculated for a whole batch
+of replicates at once with weighted kernels (matrix products and bincounts), instead of resampling the data and calling the functions once per replicate.
+"""
+from datalib.utils import *
+from datalib import profiling
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+def _prepare_AUC(scores, labels):
+    """
+    Sorts the predictions once and finds the groups of tied predictions. The observations are kept in this order: the weights of the replicates are 
+    exchangeable, so they can be drawn directly for the sorted observations.
+    """
+    scores = np.asarray(scores, dtype=float).ravel()
+    labels = np.asarray(labels, dtype=bool).ravel()
+    order = np.argsort(scores, kind="mergesort")
+    starts = np.flatnonzero(np.r_[True, np.diff(scores[order]) != 0])
+    return({"labels": labels[order], "starts": starts if len(starts) < len(scores) else None})
+
+def _kernel_AUC(prepared, w):
+    """
+    Weighted Mann-Whitney AUC of each row of weights. Each positive gets the weight below its prediction plus half the weight tied with it, and the 
+    positive-positive pairs, which add up to half the squared weight of the positives, are subtracted.
+    """
+    y = prepared["labels"]
+    pos_total = w @ y.astype(float)
+    neg_total = w.sum(axis=1) - pos_total
+    if prepared["starts"] is None: # no ties
+        below = np.cumsum(w, axis=1)
+        below -= w/2
+        u = np.einsum("ij,ij->i", w[:, y], below[:, y])
+    else:
+        pos = np.add.reduceat(w*y, prepared["starts"], axis=1)
+        total = np.add.reduceat(w, prepared["starts"], axis=1)
+        below = np.cumsum(total, axis=1)
+        below -= total/2
+        u = np.einsum("ij,ij->i", pos, below)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return((u - pos_total**2/2)/(pos_total*neg_total))
+
+def _prepare_pearson(x, y):
+    """Centers the vectors, which does not change the correlation and avoids the cancellation of the weighted moments."""
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    x = x - x.mean()
+    y = y - y.mean()
+    return({"xy": np.column_stack([x, y, x*x, y*y, x*y])})
+
+def _kernel_pearson(prepared, w):
+    """Weighted Pearson's correlation of each row of weights, from the weighted sums of x, y, x^2, y^2 and xy (one matrix product)."""
+    sums = w @ prepared["xy"] / w.sum(axis=1)[:, None]
+    mx, my, mxx, myy, mxy = sums.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return((mxy - mx*my)/np.sqrt((mxx - mx*mx)*(myy - my*my)))
+
+def _prepare_mutual_info(x, y):
+    """
+    Encodes the vectors and the pairs of values that appear, so the weighted tables of each replicate only have the observed cells. The missing values 
+    are encoded as one more level (the last one), which is left out of the entropies like in correlation.mutual_info.
+    """
+    cx, nx = factorize(x)
+    cy, ny = factorize(y)
+    cx[cx < 0] = nx
+    cy[cy < 0] = ny
+    cells, joint = np.unique(cx*(ny+1) + cy, return_inverse=True)
+    return({"joint": joint.ravel(), "cell_x": cells//(ny+1), "cell_y": cells % (ny+1), "nx": nx, "ny": ny})
+
+def _weighted_entropy(counts, total):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prob = counts/total
+        return(-np.sum(np.where(prob > 0, prob*np.log(prob), 0), axis=1))
+
+def _kernel_mutual_info(prepared, w):
+    """Weighted mutual information of each row of weights, from the weighted counts of the observed cells of the joint table."""
+    n_cells = len(prepared["cell_x"])
+    rows = np.arange(len(w))[:, None]*n_cells
+    joint = np.bincount((rows + prepared["joint"]).ravel(), weights=w.ravel(), minlength=len(w)*n_cells).reshape(len(w), n_cells)
+    nx, ny = prepared["nx"]+1, prepared["ny"]+1
+    px = np.bincount((np.arange(len(w))[:, None]*nx + prepared["cell_x"]).ravel(), weights=joint.ravel(), minlength=len(w)*nx).reshape(len(w), -1)
+    py = np.bincount((np.arange(len(w))[:, None]*ny + prepared["cell_y"]).ravel(), weights=joint.ravel(), minlength=len(w)*ny).reshape(len(w), -1)
+    present = (prepared["cell_x"] < nx-1) & (prepared["cell_y"] < ny-1)
+    total = w.sum(axis=1, keepdims=True)
+    return(_weighted_entropy(px[:, :-1], total) + _weighted_entropy(py[:, :-1], total) - _weighted_entropy(joint[:, present], total))
+
+_statistics = {
+    "AUC": (_prepare_AUC, _kernel_AUC),
+    "pearson": (_prepare_pearson, _kernel_pearson),
+    "mutual_info": (_prepare_mutual_info, _kernel_mutual_info),
+}
+
+_shared = {} # statistic and prepared data of the worker processes
+
+def _set_data(statistic, prepared, n, weights):
+    _shared.update(statistic=statistic, prepared=prepared, n=n, weights=weights)
+
+def _draw_weights(rng, size, n, weights):
+    """Weights of size replicates: the counts of n draws with replacement, or independent Poisson(1) counts."""
+    if weights == "poisson":
+        return(rng.poisson(1.0, (size, n)).astype(float))
+    draws = rng.integers(0, n, (size, n)) + np.arange(size)[:, None]*n
+    return(np.bincount(draws.ravel(), minlength=size*n).reshape(size, n).astype(float))
+
+def _bootstrap_batch(seed, size):
+    rng = np.random.default_rng(seed)
+    w = _draw_weights(rng, size, _shared["n"], _shared["weights"])
+    return(_statistics[_shared["statistic"]][1](_shared["prepared"], w))
+
+def _jackknife(statistic, prepared, n, n_groups, batch_size):
+    """
+    Grouped jackknife: the statistic without each of n_groups groups of observations, for the acceleration of the BCa interval. The groups are 
+    interleaved (observation i is in group i % n_groups), so each one spans all the data even when the observations are sorted.
+    """
+    n_groups = min(n_groups, n)
+    group = np.arange(n) % n_groups
+    values = []
+    for start in range(0, n_groups, batch_size):
+        stop = min(start+batch_size, n_groups)
+        w = (group != np.arange(start, stop)[:, None]).astype(float)
+        values.append(_statistics[statistic][1](prepared, w))
+    return(np.concatenate(values))
+
+@profiling.instrument
+def bootstrap(statistic, x, y, n_boot=1000, confidence=0.95, method="BCa", weights="multinomial", batch_size=None, n_jobs=1, seed=None,
+              jackknife_groups=100, return_replicates=False):
+    """
+    Calculates a bootstrap confidence interval of a statistic of two vectors.
+
+    Parameters
+    ----------
+    statistic (str): "AUC" (x are the predictions and y the boolean labels), "pearson" (Pearson's correlation) or "mutual_info".
+    x (list, np.array or pandas.Series): First vector.
+    y (list, np.array or pandas.Series): Second vector, of the same length.
+    n_boot (int): Number of bootstrap replicates. By default 1000.
+    confidence (float): Confidence level of the interval. By default 0.95.
+    method (str): "percentile" or "BCa" (bias corrected and accelerated). By default "BCa".
+    weights (str): "multinomial" draws n observations with replacement for each replicate (the usual bootstrap). "poisson" gives each observation an
+        independent Poisson(1) weight, which is cheaper and equivalent for large samples. By default "multinomial".
+    batch_size (int, optional): Number of replicates evaluated at once. By default as many as fit in about 16 million weights.
+    n_jobs (int): Number of processes, each one evaluates different batches. -1 uses all the CPUs. By default 1.
+    seed (int, optional): Seed of the resampling. Each batch gets its own stream, spawned from the seed, so the result does not depend on n_jobs.
+    jackknife_groups (int): Number of groups of observations of the grouped jackknife used for the acceleration of the BCa interval. By default 100.
+    return_replicates (bool): If True the values of the replicates are also returned. By default False.
+
+    Returns
+    -------
+    estimate (float): The statistic of the original data.
+    low (float): Lower limit of the interval.
+    high (float): Upper limit of the interval.
+    replicates (numpy.array): Only if return_replicates is True. The statistic of each replicate.
+
+    Notes
+    -----
+    Replicates where the statistic is not defined (for example without positives for the AUC) are ignored.
+    """
+    if statistic not in _statistics:
+        print(f"The statistic is not recognized. Please select one of the following: {', '.join(_statistics)}")
+        return(None)
+    if method not in ("percentile", "BCa"):
+        print("The method is not recognized. Please select one of the following:\n -percentile\n -BCa")
+        return(None)
+    prepare, kernel = _statistics[statistic]
+    prepared = prepare(x, y)
+    n = len(np.asarray(x).ravel())
+    estimate = float(kernel(prepared, np.ones((1, n)))[0])
+
+    if batch_size is None:
+        batch_size = max(1, min(n_boot, 2**24//max(n, 1)))
+    sizes = [min(batch_size, n_boot-start) for start in range(0, n_boot, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if n_jobs == 1 or len(sizes) < 2:
+        profiling.note_path("serial")
+        _set_data(statistic, prepared, n, weights)
+        try:
+            replicates = [_bootstrap_batch(s, size) for s, size in zip(seeds, sizes)]
+        finally:
+            _shared.clear()
+    else:
+        profiling.note_path("parallel")
+        with ProcessPoolExecutor(n_jobs, initializer=_set_data, initargs=(statistic, prepared, n, weights)) as pool:
+            replicates = list(pool.map(_bootstrap_batch, seeds, sizes))
+    replicates = np.concatenate(replicates)
+    valid = replicates[~np.isnan(replicates)]
+
+    alpha = (1-confidence)/2
+    if method == "percentile" or len(valid) == 0:
+        low, high = np.quantile(valid, [alpha, 1-alpha]) if len(valid) else (np.nan, np.nan)
+    else:
+        normal = NormalDist()
+        below = (np.sum(valid < estimate) + np.sum(valid == estimate)/2)/len(valid)
+        z0 = normal.inv_cdf(min(max(below, 1/(2*len(valid))), 1-1/(2*len(valid))))
+        jack = _jackknife(statistic, prepared, n, jackknife_groups, batch_size)
+        diff = np.nanmean(jack) - jack
+        denominator = 6*np.nansum(diff**2)**1.5
+        a = np.nansum(diff**3)/denominator if denominator > 0 else 0.0
+        levels = []
+        for z in (normal.inv_cdf(alpha), normal.inv_cdf(1-alpha)):
+            levels.append(normal.cdf(z0 + (z0+z)/(1 - a*(z0+z))))
+        low, high = np.quantile(valid, levels)
+    if return_replicates:
+        return(estimate, float(low), float(high), replicates)
+    return(estimate, float(low), float(high))
+
+def bootstrap_AUC(scores, labels, **kwargs):
+    """Bootstrap confidence interval of the AUC of the predictions scores with the boolean true labels. See bootstrap for the options and the result."""
+    return(bootstrap("AUC", scores, labels, **kwargs))
+
+def bootstrap_pearson(x, y, **kwargs):
+    """Bootstrap confidence interval of the Pearson's correlation of the vectors x and y. See bootstrap for the options and the result."""
+    return(bootstrap("pearson", x, y, **kwargs))
+
+def bootstrap_mutual_info(x, y, **kwargs):
+    """Bootstrap confidence interval of the mutual information of the vectors x and y. See bootstrap for the options and the result."""
+    return(bootstrap("mutual_info", x, y, **kwargs))
@@ -0,0 +1,288 @@
+import numpy as np
+import pandas as pd
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang and Liberty, 2016) that summarizes a stream of values in bounded memory.
+    
+    The values are kept in a hierarchy of compactors. When a compactor is full it is sorted and every other value is promoted to the next level, where 
+    each value represents twice as many values of the stream. Sketches built on different chunks or workers can be merged into one.
+    
+    Parameters
+    ----------
+    k (int): Size of the largest compactor. A larger k gives a smaller rank error (see rank_error), k=200 gives quantiles within about 1.3% of the requested rank. By default 200.
+    seed (int, optional): Seed of the random choices of the compactions, for reproducible results.
+    
+    Notes
+    -----
+    The memory used is O(k) values, independently of the number of values added. Missing values are ignored.
+    """
+    
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+    
+    @classmethod
+    def from_rank_error(cls, rank_error, seed=None):
+        """
+        Creates a sketch with the smallest k that gives the requested rank error.
+        
+        Parameters
+        ----------
+        rank_error (float): Maximum error in the rank of the quantiles, as a fraction of the number of values (for example 0.01).
+        seed (int, optional): Seed of the random choices of the compactions.
+        
+        Returns
+        -------
+        KLLSketch: Empty sketch.
+        """
+        return(cls(int(np.ceil((2.296/rank_error)**(1/0.9723))), seed))
+    
+    @property
+    def rank_error(self):
+        """Maximum error in the rank of the quantiles with 99% confidence, as a fraction of the number of values. Empirical bound of the Apache DataSketches KLL sketch."""
+        return(2.296/self.k**0.9723)
+    
+    def update(self, values):
+        """
+        Adds a chunk of values to the sketch.
+        
+        Parameters
+        ----------
+        values (list, np.array or pandas.Series): Values to add.
+        
+        Returns
+        -------
+        KLLSketch: The sketch itself.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+        return(self)
+    
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch to this one.
+        
+        Parameters
+        ----------
+        other (KLLSketch): Sketch to merge.
+        
+        Returns
+        -------
+        KLLSketch: The sketch itself.
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.n += other.n
+        self._compress()
+        return(self)
+    
+    def quantile(self, q):
+        """
+        Returns the values whose rank in the stream is approximately q*n.
+        
+        Parameters
+        ----------
+        q (float or np.array): Quantiles, between 0 and 1.
+        
+        Returns
+        -------
+        float or np.array: Approximate quantiles. NaN if the sketch is empty.
+        """
+        if self.n == 0:
+            return(np.full(np.shape(q), np.nan)[()])
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(c), 2**level) for level, c in enumerate(self.compactors)])
+        order = np.argsort(items, kind="mergesort")
+        cum = np.cumsum(weights[order])
+        ind = np.searchsorted(cum, np.asarray(q)*cum[-1], side="right") # first value with more than q*n values up to it
+        return(items[order][np.minimum(ind, len(items)-1)])
+    
+    def _capacity(self, level):
+        return(max(2, int(np.ceil(self.k*(2/3)**(len(self.compactors)-1-level)))))
+    
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            if len(self.compactors[level]) <= self._capacity(level):
+                level += 1
+                continue
+            if level+1 == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            items = np.sort(self.compactors[level])
+            keep = items[len(items) - len(items)%2:] # with an odd number of values the largest one stays
+            promoted = items[self._rng.integers(2):len(items) - len(items)%2:2]
+            self.compactors[level] = keep
+            self.compactors[level+1] = np.concatenate([self.compactors[level+1], promoted])
+            level = 0 # the capacities change when a level is added
+
+def _hash_values(values):
+    """64 bit hash of each value. Equal values of the same type always get the same hash."""
+    values = np.asarray(values)
+    if values.dtype.kind in "OUS":
+        values = values.astype(object)
+    return(pd.util.hash_array(values))
+
+def _mix(h):
+    """splitmix64 finalizer, used to derive independent pseudo random numbers from a hash."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return(h ^ (h >> np.uint64(31)))
+
+def _uniform(h):
+    """Uniform numbers in (0, 1) from 64 bit integers."""
+    return(((h >> np.uint64(11)).astype(float) + 0.5) / 2.0**53)
+
+class EntropySketch:
+    """
+    Mergeable sketch that estimates the entropy of a stream of discrete values in bounded memory, whatever the number of distinct values.
+    
+    It keeps k random projections of the counts of the values on maximally skewed stable variables (Clifford and Cosma, 2013). The variables of each 
+    value are derived from its hash, so the same value gets the same variables in every chunk and in every worker, and the sketches can be merged by 
+    adding the projections.
+    
+    Parameters
+    ----------
+    k (int): Number of projections. The standard error of the estimate decreases as 1/sqrt(k). By default 1024.
+    seed (int): Seed of the projections. Only sketches with the same k and seed can be merged. By default 0.
+    
+    Notes
+    -----
+    The logarithm used is the natural logarithm (base-e), like metrics.entropy.
+    """
+    
+    def __init__(self, k=1024, seed=0):
+        self.k = k
+        self.seed = seed
+        self.n = 0
+        self.y = np.zeros(k)
+        self._keys = _mix(np.arange(1, k+1, dtype=np.uint64)*np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed))
+    
+    def update(self, values, block_size=2048):
+        """
+        Adds a chunk of values to the sketch.
+        
+        Parameters
+        ----------
+        values (list, np.array or pandas.Series): Discrete values.
+        block_size (int): Number of distinct values projected at a time, which bounds the temporary memory to block_size*k numbers. By default 2048.
+        
+        Returns
+        -------
+        EntropySketch: The sketch itself.
+        """
+        counts = pd.Series(np.asarray(values)).value_counts(dropna=False, sort=False)
+        hashes = _hash_values(counts.index.to_numpy())
+        counts = counts.to_numpy(dtype=float)
+        for start in range(0, len(hashes), block_size):
+            h = hashes[start:start+block_size, None] ^ self._keys[None, :]
+            h1 = _mix(h)
+            w1 = np.pi*(_uniform(h1)-0.5)
+            w2 = -np.log(_uniform(_mix(h1)))
+            r = np.tan(w1)*(np.pi/2-w1) + np.log(w2*np.cos(w1)/(np.pi/2-w1))
+            self.y += counts[start:start+block_size] @ r
+        self.n += int(counts.sum())
+        return(self)
+    
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch to this one.
+        
+        Parameters
+        ----------
+        other (EntropySketch): Sketch with the same k and seed.
+        
+        Returns
+        -------
+        EntropySketch: The sketch itself.
+        """
+        if other.k != self.k or other.seed != self.seed:
+            raise ValueError("Only sketches with the same k and seed can be merged.")
+        self.y += other.y
+        self.n += other.n
+        return(self)
+    
+    def entropy(self):
+        """
+        Returns the estimated entropy of the values added so far.
+        
+        Returns
+        -------
+        float: Estimated entropy, never negative.
+        """
+        if self.n == 0:
+            return(0.0)
+        z = self.y/self.n
+        z_max = z.max()
+        return(max(0.0, float(-(z_max + np.log(np.mean(np.exp(z - z_max)))))))
+
+class HyperLogLog:
+    """
+    Mergeable sketch that estimates the number of distinct values of a stream in bounded memory (Flajolet et al., 2007).
+    
+    Parameters
+    ----------
+    p (int): The sketch uses 2**p registers of one byte. The relative standard error is 1.04/sqrt(2**p), about 1.6% for the default p=12.
+    """
+    
+    def __init__(self, p=12):
+        self.p = p
+        self.registers = np.zeros(2**p, dtype=np.uint8)
+    
+    def update(self, values):
+        """
+        Adds a chunk of values to the sketch.
+        
+        Parameters
+        ----------
+        values (list, np.array or pandas.Series): Values.
+        
+        Returns
+        -------
+        HyperLogLog: The sketch itself.
+        """
+        h = _mix(_hash_values(values))
+        index = (h >> np.uint64(64-self.p)).astype(np.intp)
+        w = (h << np.uint64(self.p)) | np.uint64(1 << (self.p-1)) # the guard bit bounds the rank
+        rank = (64 - np.floor(np.log2(w.astype(float)))).astype(np.uint8) # position of the first 1 bit
+        np.maximum.at(self.registers, index, rank)
+        return(self)
+    
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch to this one.
+        
+        Parameters
+        ----------
+        other (HyperLogLog): Sketch with the same p.
+        
+        Returns
+        -------
+        HyperLogLog: The sketch itself.
+        """
+        if other.p != self.p:
+            raise ValueError("Only sketches with the same p can be merged.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return(self)
+    
+    def count(self):
+        """
+        Returns the estimated number of distinct values added so far.
+        
+        Returns
+        -------
+        float: Estimated number of distinct values.
+        """
+        m = len(self.registers)
+        estimate = 0.7213/(1+1.079/m) * m**2 / np.sum(2.0**-self.registers.astype(float))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5*m and zeros > 0: # linear counting for small cardinalities
+            estimate = m*np.log(m/zeros)
+        return(float(estimate))
@@ -5,9 +5,21 @@ from datalib import filtering
 from datalib import feature_scaling
 from datalib import plotting
 from datalib import utils
+from datalib import sketches
+from datalib import benchmark
+from datalib import profiling
+from datalib import dataset
+from datalib import resampling
+from datalib import caching
+from importlib import import_module
 import numpy as np
+import pickle
+import pytest
 import pandas as pd
 
+correlation_module = import_module("datalib.correlation") # the package attributes are the functions with the same name
+feature_scaling_module = import_module("datalib.feature_scaling")
+
 permutation_matrix=[[1,5,2,4,3],[1,5,4,3,2],[2,5,1,3,4],[1,4,5,3,2],[3,5,4,1,2],[1,2,3,4,5],[5,4,3,2,1],[2,3,5,4,1]]
 permutation_df = pd.DataFrame(permutation_matrix,columns=["Var1","Var2","Var3","Var4","Var5"])
 single_permutation = [1,5,2,4,3]
@@ -60,3 +72,461 @@ def test_all():
     a=[0.98,0.2,0.1]
     plotting.plot_entropy(a)
 
+
+def test_AUC():
+    """Checks the sort based AUC against the pairwise definition and the TPR/FPR lists of the original threshold sweep"""
+    AUC, TPR, FPR = metrics.AUC(clasif_res, return_TPR_FPR=True)
+    assert abs(AUC-0.8)<1e-12
+    assert TPR == [1.0, 1.0, 1.0, 0.8, 0.8, 0.6, 0.6, 0.6, 0.4, 0.2]
+    assert FPR == [1.0, 0.8, 0.6, 0.6, 0.4, 0.4, 0.2, 0.0, 0.0, 0.0]
+    
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 20, 300)/20
+    lab = rng.random(300) < y
+    pos, neg = y[lab], y[~lab]
+    pairwise = ((pos[:,None] > neg[None,:]) + 0.5*(pos[:,None] == neg[None,:])).mean()
+    assert abs(metrics.AUC(y, labels=lab)-pairwise)<1e-12
+    
+    missing = np.r_[y, np.nan, np.nan] # missing predictions are ignored
+    assert abs(metrics.AUC(missing, labels=np.r_[lab, False, True])-pairwise)<1e-12
+    for empty in ([np.nan, np.nan], []): # nothing left after ignoring the missing predictions
+        assert metrics.AUC(empty, labels=[True, False][:len(empty)]) is None
+        assert metrics.ROC_curve(empty, [True, False][:len(empty)]) is None
+    assert metrics.AUC(pd.DataFrame({"pred": [np.nan, np.nan], "label": [True, False]})) is None
+
+def test_StreamingAUC():
+    """Checks that the merged streaming accumulator stays within its error bound of the exact AUC"""
+    rng = np.random.default_rng(1)
+    y = rng.random(5000)
+    lab = rng.random(5000) < y
+    acc, other = metrics.StreamingAUC(100), metrics.StreamingAUC(100)
+    for i in range(0, 5000, 1000):
+        (acc if i < 3000 else other).update(y[i:i+1000], lab[i:i+1000])
+    acc.merge(other)
+    assert abs(acc.result()-metrics.AUC(y, labels=lab)) <= acc.error_bound()
+    counts = acc.pos.sum() + acc.neg.sum()
+    acc.update([np.nan, 0.5], [True, False]) # missing predictions are ignored
+    assert acc.pos.sum() + acc.neg.sum() == counts + 1
+
+def test_pearsons_correlation_matrix():
+    """Checks the blocked matrix Pearson's correlation against the pairwise function"""
+    r = correlation(cont_df, block_size=2)
+    for i in cont_df.columns:
+        for j in cont_df.columns:
+            assert abs(r.loc[i,j]-correlation_module.pearsons_correlation(cont_df[i], cont_df[j]))<1e-12
+    assert correlation(cont_df, dtype="float32").values.dtype == np.float32
+
+def test_mutual_info():
+    """Checks the bincount based mutual information against values of the original mask based implementation"""
+    mi = correlation(categorical_df)
+    assert abs(mi.loc["Var1","Var2"]-0.318257)<1e-6 and abs(mi.loc["Var4","Var5"]-0.033559)<1e-6
+    assert abs(correlation_module.mutual_info(categorical_df["Var3"], categorical_df["Var1"])-mi.loc["Var1","Var3"])<1e-12
+    assert abs(mi.loc["Var2","Var2"]-np.log(2))<1e-12
+
+def test_correlation_n_jobs():
+    """Checks that the parallel mutual information matrix matches the serial one"""
+    assert np.allclose(correlation(categorical_df, n_jobs=2).values, correlation(categorical_df).values)
+
+def test_sparse_correlation():
+    """Checks the thresholded and top-k edge lists against the dense correlation matrix"""
+    r = correlation(cont_df)
+    edges = correlation_module.sparse_correlation(cont_df, threshold=0.5, block_size=2)
+    assert len(edges) == np.sum(np.abs(r.values[np.triu_indices(5, 1)]) >= 0.5)
+    assert all(abs(r.loc[a,b]-v)<1e-12 for a, b, v in edges.itertuples(index=False))
+    
+    edges = correlation_module.sparse_correlation(categorical_df, top_k=1)
+    assert list(edges["var2"]) == ["Var2", "Var1", "Var2", "Var2", "Var1"]
+
+def test_discretize():
+    """Checks the searchsorted discretization against the interval definitions"""
+    data, cut_pts = discretization.discretize([11.5,10.2,1.2,0.5,5.3,20.5,8.4],4)
+    assert np.allclose(cut_pts[0], [5.5, 10.5, 15.5])
+    assert str(data["Var 1"].dtype) == "category"
+    assert data["Var 1"].tolist() == ["I3:(10.5,15.5]", "I2:(5.5,10.5]", "I1:( -infty ,5.5]", "I1:( -infty ,5.5]", "I1:( -infty ,5.5]", "I4:(15.5 , infty )", "I2:(5.5,10.5]"]
+    
+    data, cut_pts = discretization.discretize(permutation_df, 2, "EF")
+    for name, cut_pt in zip(permutation_df.columns, cut_pts):
+        assert (data[name].cat.codes == (permutation_df[name] > cut_pt[0])).all()
+
+def test_discretizers(tmp_path):
+    """Checks that the fitted discretizers reproduce discretize, also when fitted by chunks and after being saved"""
+    for disc, alg in [(discretization.EqualWidthDiscretizer(3), "EW"), (discretization.EqualFrequencyDiscretizer(3), "EF")]:
+        expected = discretization.discretize(cont_df, 3, alg)[0]
+        disc.partial_fit(cont_df.iloc[:4]).partial_fit(cont_df.iloc[4:])
+        assert disc.transform(cont_df).equals(expected)
+        disc.save(tmp_path / f"{alg}.npz")
+        assert type(disc).load(tmp_path / f"{alg}.npz").transform(cont_df).equals(expected)
+
+def test_sketch_discretizer():
+    """Checks that the sketch based equal frequency cut points are within the rank error when fitted by chunks in separate workers"""
+    x = pd.DataFrame({"x": np.random.default_rng(2).normal(size=100000)})
+    workers = [discretization.EqualFrequencyDiscretizer(4, rank_error=0.02, seed=i) for i in range(2)]
+    for i, chunk in enumerate(utils.iter_chunks(x, 10000)):
+        workers[i%2].partial_fit(chunk)
+    disc = workers[0].merge(workers[1])
+    ranks = np.searchsorted(np.sort(x["x"]), disc.cut_points_["x"])/len(x)
+    assert np.all(np.abs(ranks-[0.25, 0.5, 0.75]) <= 0.02)
+    assert sketches.KLLSketch.from_rank_error(0.02).rank_error <= 0.02
+
+    exact = discretization.EqualFrequencyDiscretizer(4).fit(x) # only the cut points are kept
+    assert len(pickle.dumps(exact)) < 2000
+    assert np.array_equal(exact.cut_points_["x"], discretization.discretize(x, 4, "EF")[1][0])
+    with pytest.raises(ValueError):
+        exact.partial_fit(x)
+
+def test_filter_condition_list():
+    """Checks the compiled single pass filters, including grouped conditions, modifications and the cache"""
+    data = pd.DataFrame({"entropy": [1.0, 2.5, 0.5, 3.0, 2.0], "AUC": [0.8, 0.9, 0.7, 0.8, 0.6]})
+    result = filtering.filter_condition_list(data, ["entropy <= 2, 3", "AUC > 0.75 | entropy < 1"])
+    assert result["entropy"].tolist() == [3, 2.5, 3.0] and result["AUC"].tolist() == [0.8, 0.9, 0.8]
+    assert data["entropy"].tolist() == [1.0, 2.5, 0.5, 3.0, 2.0]
+    assert filtering.compile_conditions(["AUC > 0.7 & entropy != 2"]) is filtering.compile_conditions(["AUC > 0.7 & entropy != 2"])
+    
+    filtering.filter_condition_list(data, ["AUC > 0.7 & entropy != 2.5"], inplace=True)
+    assert data["entropy"].tolist() == [1.0, 3.0]
+    
+    data = pd.DataFrame({"s": ["x", "y", "z"], "a": [1.0, 2.0, 3.0]})
+    result = filtering.filter_condition_list(data, ["s > 1", "a > 1", "s < 2, 0"]) # the conditions on the string column are skipped
+    assert result["s"].tolist() == ["y", "z"] and result["a"].tolist() == [2.0, 3.0]
+
+def test_filter_chunks(tmp_path):
+    """Checks that filtering a file by chunks gives the same rows as filtering it at once"""
+    data = pd.DataFrame({"a": np.random.default_rng(3).random(1000), "b": np.arange(1000) % 7})
+    data.to_csv(tmp_path / "data.csv", index=False)
+    condition_list = ["a > 0.5, 1", "b < 3 | a < 0.2"]
+    expected = filtering.filter_condition_list(pd.read_csv(tmp_path / "data.csv"), condition_list)
+    assert pd.concat(filtering.filter_chunks(tmp_path / "data.csv", condition_list, chunksize=128)).equals(expected)
+    assert filtering.filter_to_file(data, tmp_path / "out.csv", condition_list, chunksize=100) == len(expected)
+    assert np.allclose(pd.read_csv(tmp_path / "out.csv").values, expected.values)
+
+def test_scalers(tmp_path):
+    """Checks the scalers fitted by chunks against normalize and standarize, and the saved parameters"""
+    x = np.random.default_rng(4).normal(3, 2, (1000, 4))
+    for scaler, function in [(feature_scaling_module.MinMaxScaler(), feature_scaling_module.normalize), (feature_scaling_module.StandardScaler(), feature_scaling_module.standarize)]:
+        for chunk in np.array_split(x, 7):
+            scaler.partial_fit(chunk, block_rows=50)
+        expected = np.apply_along_axis(function, 0, x)
+        assert np.allclose(scaler.transform(x), expected)
+        scaler.save(tmp_path / "scaler.npz")
+        x32 = x.astype("float32")
+        assert type(scaler).load(tmp_path / "scaler.npz").transform(x32, dtype="float32", inplace=True) is x32
+        assert np.allclose(x32, expected, atol=1e-5)
+
+    data = pd.DataFrame({"a": [1., 2, 3], "b": [10., 40, 20]})
+    scaler = feature_scaling_module.MinMaxScaler().fit(data)
+    assert scaler.transform(data[["b", "a"]]).equals(scaler.transform(data)) # the columns are matched by name
+    with pytest.raises(ValueError):
+        scaler.transform(data[["a"]])
+    assert feature_scaling(data, "unknown") is not data
+
+def test_calc_metrics_chunked():
+    """Checks that the metrics merged from chunks match calc_metrics, also for mixed data"""
+    mixed = pd.concat([cont_df[["Var1", "Var2"]], categorical_df.iloc[:, :2].reindex(range(8)).fillna("a").add_prefix("cat")], axis=1)
+    missing = cont_df.copy()
+    missing.iloc[[1, 3, 4, 5], 0] = np.nan # a whole chunk without values, the NaN are skipped like in calc_metrics
+    for data in [cont_df, categorical_df, mixed, missing]:
+        expected = metrics.calc_metrics(data)
+        for n_jobs in [1, 2]:
+            result = metrics.calc_metrics_chunked(data, chunksize=3, n_jobs=n_jobs)
+            assert np.allclose(result.values, expected.values) and result.name == expected.name
+    assert abs(metrics.calc_metrics(mixed)["Var1"]-metrics.variance(cont_df["Var1"]))<1e-12
+
+def test_entropy():
+    """Checks the bincount entropy, the categorical fast path and the sketch based approximation"""
+    assert abs(metrics.entropy(single_categorical)-metrics.entropy(np.array(single_categorical)))<1e-12
+    assert abs(metrics.entropy(pd.Categorical(["a","b","a","b"], categories=["a","b","c","d"]), normalize=True)-0.5)<1e-12
+    assert np.allclose(metrics.entropy_columns(categorical_df).values, [metrics.entropy(categorical_df[name].to_numpy()) for name in categorical_df.columns])
+    
+    x = np.random.default_rng(5).zipf(1.5, 20000) % 1000
+    assert abs(metrics.entropy(x, approx=True)-metrics.entropy(x)) < 0.2
+    assert abs(sketches.HyperLogLog().update(x).count()-len(np.unique(x))) < 0.1*len(np.unique(x))
+    
+    # missing values are not a level on any path, and the probabilities are divided by the length, like the original implementation
+    assert abs(metrics.entropy(np.array([1., 2, np.nan]))-2/3*np.log(3))<1e-12
+    assert abs(metrics.entropy(pd.Series(["a", "b", None, "a"]))-metrics.entropy(pd.Categorical(["a", "b", None, "a"])))<1e-12
+    assert abs(metrics.entropy(np.r_[x, [np.nan]*2000], approx=True)-metrics.entropy(np.r_[x, [np.nan]*2000])) < 0.2
+    u = pd.Series([1., 2, np.nan, 1, 2, 3, np.nan, 1])
+    v = pd.Series(["p", None, "q", "p", "q", "q", "p", "p"])
+    mi = correlation_module.mutual_info(u, v)
+    assert abs(mi-0.801028)<1e-6 # value of the original mask based implementation
+    assert np.allclose(correlation(pd.DataFrame({"u": u.astype(str).where(u.notna()), "v": v})).values, [[metrics.entropy(u), mi], [mi, metrics.entropy(v)]])
+    assert np.isclose(resampling._kernel_mutual_info(resampling._prepare_mutual_info(u, v), np.ones((1, 8)))[0], mi)
+    tracker = correlation_module.CorrelationTracker().add(pd.DataFrame({"u": u.astype(str).where(u.notna()), "v": v}))
+    assert np.isclose(tracker.correlation().loc["u", "v"], mi)
+
+def test_benchmark():
+    """Runs the benchmark suite at a toy size and checks the regression detection"""
+    current = benchmark.run(rows=[200], cols=[3])
+    assert {r["case"] for r in current["results"]} == set(benchmark.CASES) | set(benchmark.IMPORT_CASES)
+    assert benchmark.compare(current, current) == []
+    slower = {"results": [dict(r, seconds=r["seconds"]*2+1) for r in current["results"]]}
+    assert len(benchmark.compare(slower, current, threshold=0.5, min_seconds=0)) == len(current["results"])
+
+def test_profiling(tmp_path):
+    """Checks that the instrumented calls are only recorded inside profile() and that the code paths reach the counters and the hooks"""
+    metrics.calc_metrics(categorical_df)
+    assert not profiling.is_enabled()
+    records = []
+    profiling.add_export_hook(records.append)
+    try:
+        with profiling.profile():
+            metrics.calc_metrics(categorical_df)
+            discretization.discretize(cont_df, 3, "EF")
+            correlation(cont_df)
+            discretization.EqualWidthDiscretizer(3).fit(cont_df)
+            discretization.EqualFrequencyDiscretizer(3).fit(cont_df)
+    finally:
+        profiling.remove_export_hook(records.append)
+    assert not profiling.is_enabled()
+    stats = profiling.get_stats()
+    assert stats["metrics.calc_metrics"]["calls"] == 1
+    assert stats["metrics.calc_metrics"]["paths"] == {"entropy": 1}
+    assert stats["discretization.discretize"]["paths"] == {"EF": 1}
+    assert stats["discretization.discretize"]["rows"] == cont_df.shape[0]
+    assert stats["correlation.pearsons_correlation_matrix"]["bytes_copied"] == cont_df.size*8
+    for name in ("EqualWidthDiscretizer", "EqualFrequencyDiscretizer"): # methods are measured on their data and named after the class
+        assert stats[f"discretization.{name}.fit"]["calls"] == 1
+        assert (stats[f"discretization.{name}.fit"]["rows"], stats[f"discretization.{name}.fit"]["cols"]) == cont_df.shape
+    assert {r["function"] for r in records} == set(stats)
+    profiling.export(tmp_path / "stats.json")
+    assert (tmp_path / "stats.json").exists()
+
+def test_data2df(tmp_path):
+    """Checks that numpy arrays and .npy files are wrapped without copying and that the views are read-only unless a copy is asked for"""
+    x = np.arange(12, dtype=float).reshape(4, 3)
+    df = utils.data2df(x)
+    assert np.shares_memory(df.to_numpy(), x)
+    assert list(df.columns) == ["Var 1", "Var 2", "Var 3"]
+    assert x.flags.writeable and not df.to_numpy().flags.writeable
+    df_copy = utils.data2df(x, copy=True)
+    df_copy.iloc[0, 0] = -1
+    assert x[0, 0] == 0
+    np.save(tmp_path / "x.npy", x)
+    df_file = utils.data2df(str(tmp_path / "x.npy"))
+    base = df_file.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    assert np.array_equal(df_file.to_numpy(), x)
+    assert utils.data2df([[1, "a"], [2, "b"]]).dtypes.tolist() == [np.dtype("int64"), np.dtype("O")]
+    assert utils.data2df(np.zeros((2, 2, 2))) is None
+    assert metrics.calc_metrics(np.zeros((2, 2, 2))) is None
+
+def test_memmap_dataset(tmp_path):
+    """Checks that the functions give the same results for a memory-mapped dataset, read by small blocks, as for the data in memory"""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((1000, 4))
+    x[:, 1] += x[:, 0]
+    np.save(tmp_path / "x.npy", x)
+    ds = dataset.MemmapDataset(str(tmp_path / "x.npy"), block_bytes=4096)
+    assert ds.shape == (1000, 4) and ds.block_rows == 128
+    assert np.allclose(correlation(ds).to_numpy(), np.corrcoef(x.T))
+    assert np.allclose(metrics.calc_metrics(ds).to_numpy(), x.var(axis=0))
+    blocks, cut_pts = discretization.discretize(ds, 4, "EF")
+    data_new, cut_pts_ref = discretization.discretize(x, 4, "EF")
+    assert all(np.array_equal(a, b) for a, b in zip(cut_pts, cut_pts_ref))
+    assert (pd.concat(blocks).astype(str).to_numpy() == data_new.astype(str).to_numpy()).all()
+    scaled = feature_scaling(ds, "satandarize", output=str(tmp_path / "scaled.npy"))
+    assert np.allclose(scaled.column("Var 2"), feature_scaling(x, "satandarize")["Var 2"])
+    
+    for i in range(4):
+        x[:, i].tofile(tmp_path / f"col{i}.bin")
+    ds_columns = dataset.MemmapDataset([str(tmp_path / f"col{i}.bin") for i in range(4)], dtype="float64", block_bytes=4096)
+    assert ds_columns.names == ["col0", "col1", "col2", "col3"]
+    assert np.allclose(correlation(ds_columns).to_numpy(), np.corrcoef(x.T))
+
+def test_infer_schema():
+    """Checks the kinds of compact and nullable columns, the cache of the schema and the dispatch of calc_metrics with float32 data"""
+    df = pd.DataFrame({"a": np.ones(3, dtype=np.float32), "b": pd.array([1, None, 3], dtype="Int64"), "c": [True, False, True], "d": ["x", "y", "z"], 
+                       "e": pd.array([1.5, None, 2], dtype="Float64"), "f": np.arange(3, dtype=np.uint8)})
+    schema = utils.infer_schema(df)
+    assert schema.tolist() == ["continuous", "discrete", "boolean", "categorical", "continuous", "discrete"]
+    assert utils.infer_schema(df) is schema
+    df["a"] = ["u", "v", "w"]
+    assert utils.infer_schema(df)["a"] == "categorical"
+    assert utils.is_cont(df[["e"]]) and utils.is_num(df[["b", "f"]]) and not utils.is_num(df)
+    
+    compact = cont_df.astype(np.float32)
+    assert metrics.calc_metrics(compact).name == "Variance"
+    assert np.allclose(metrics.calc_metrics(compact), metrics.calc_metrics(cont_df), rtol=1e-5)
+
+def test_lazy_import():
+    """Checks in a new interpreter that importing datalib does not load matplotlib, and that the plotting functions are loaded when they are used"""
+    import subprocess, sys
+    script = ("import sys, datalib; assert 'matplotlib' not in sys.modules; assert 'plot_ROC' in dir(datalib) and 'plot_ROC' in datalib.__all__; "
+              "datalib.plot_ROC; assert 'matplotlib' in sys.modules")
+    subprocess.run([sys.executable, "-c", script], check=True)
+    import datalib
+    assert {"correlation", "AUC", "CONTINUOUS"} <= set(datalib.__all__) and not {"np", "pd", "os", "OrderedDict", "profiling"} & set(datalib.__all__)
+
+def test_headless_plotting(tmp_path):
+    """Checks that the plots are saved to files without pyplot, that long ROC curves are downsampled and that batches reuse the figures"""
+    x = np.linspace(0, 1, 100001)
+    xs, ys = plotting.downsample_curve(x, np.sqrt(x), max_points=500)
+    assert len(xs) <= 500 and xs[0] == 0 and xs[-1] == 1
+    ax = plotting.plot_ROC(x, np.sqrt(x), 0.66, path=tmp_path / "roc.svg")
+    assert len(ax.lines[0].get_xdata()) <= 1000 and (tmp_path / "roc.svg").exists()
+    plotting.plot_CM(pd.DataFrame(np.random.rand(1200, 1200)), path=tmp_path / "cm.png", max_pixels=300)
+    assert (tmp_path / "cm.png").exists()
+    
+    jobs = [("ROC", {"TPR": x[::1000], "FPR": x[::1000]**2, "AUC": 0.5}, tmp_path / f"roc_{i}.png") for i in range(3)]
+    jobs.append(("entropy", {"x": [0.98, 0.2, 0.1]}, tmp_path / "entropy.png"))
+    assert plotting.render_batch(jobs) == [path for kind, kwargs, path in jobs]
+    assert all(path.exists() for kind, kwargs, path in jobs)
+
+def test_batch_AUC():
+    """Checks the AUC and the ROC curves of several models and segments against AUC and ROC_curve of each one"""
+    rng = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({"segment": rng.choice(["a", "b", "c"], n), "label": rng.random(n) < 0.4})
+    df["model1"] = np.round(rng.random(n)*0.6 + 0.3*df["label"], 2) # with ties
+    df["model2"] = rng.random(n)
+    result, roc = metrics.batch_AUC(df, "label", segment="segment", return_ROC=True)
+    assert result.shape == (6, 5) and list(result.columns) == ["segment", "model", "n", "positives", "AUC"]
+    for (segment, model), row in result.set_index(["segment", "model"]).iterrows():
+        part = df[df["segment"] == segment]
+        assert np.isclose(row["AUC"], metrics.AUC(part[model].to_numpy(), labels=part["label"].to_numpy()))
+        TPR, FPR, thresholds = metrics.ROC_curve(part[model], part["label"])
+        curve = roc[(roc["segment"] == segment) & (roc["model"] == model)]
+        assert np.allclose(curve["TPR"], TPR) and np.allclose(curve["FPR"], FPR) and np.array_equal(curve["threshold"], thresholds)
+    
+    whole = metrics.batch_AUC(df, "label", ["model1"])
+    assert np.isclose(whole["AUC"].item(), metrics.AUC(df["model1"].to_numpy(), labels=df["label"].to_numpy()))
+
+    df["segment"] = pd.Categorical(df["segment"], categories=["a", "b", "c", "z"]) # an unused category
+    categorical = metrics.batch_AUC(df, "label", segment="segment")
+    assert categorical.shape == (6, 5) and categorical["n"].dtype.kind == "i" and not categorical["AUC"].isna().any()
+    assert np.allclose(categorical["AUC"], result["AUC"])
+
+def test_bootstrap():
+    """Checks the weighted kernels against the functions on the resampled data, the reproducibility of the seeds and the intervals"""
+    rng = np.random.default_rng(0)
+    n = 500
+    scores = np.round(rng.random(n), 1) # with ties
+    labels = rng.random(n) < scores
+    x = rng.standard_normal(n)
+    y = x + rng.standard_normal(n)
+    a = rng.integers(0, 4, n)
+    b = (a + rng.integers(0, 2, n)) % 5
+    
+    w = resampling._draw_weights(np.random.default_rng(1), 2, n, "multinomial")
+    assert (w.sum(axis=1) == n).all()
+    idx = np.repeat(np.arange(n), w[0].astype(int))
+    assert np.isclose(resampling._kernel_pearson(resampling._prepare_pearson(x, y), w)[0], correlation_module.pearsons_correlation(x[idx], y[idx]))
+    assert np.isclose(resampling._kernel_mutual_info(resampling._prepare_mutual_info(a, b), w)[0], correlation_module.mutual_info(a[idx], b[idx]))
+    order = np.argsort(scores, kind="mergesort") # the AUC weights refer to the sorted predictions
+    idx = np.repeat(order, w[0].astype(int))
+    assert np.isclose(resampling._kernel_AUC(resampling._prepare_AUC(scores, labels), w)[0], metrics.AUC(scores[idx], labels=labels[idx]))
+    
+    estimate, low, high = resampling.bootstrap_AUC(scores, labels, n_boot=200, seed=3, batch_size=30)
+    assert np.isclose(estimate, metrics.AUC(scores, labels=labels)) and low < estimate < high
+    assert resampling.bootstrap_AUC(scores, labels, n_boot=200, seed=3, batch_size=30, n_jobs=2) == (estimate, low, high)
+    estimate, low, high = resampling.bootstrap_pearson(x, y, n_boot=200, seed=3, method="percentile")
+    assert low < estimate < high
+    estimate, low, high = resampling.bootstrap_mutual_info(a, b, n_boot=200, seed=3, weights="poisson")
+    assert np.isclose(estimate, correlation_module.mutual_info(a, b)) and low < high
+
+def test_CorrelationTracker():
+    """Checks that a sliding window kept with add and remove gives the same matrix as correlation of the rows in the window"""
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((600, 4))
+    x[:, 1] += x[:, 0]
+    numeric = pd.DataFrame(x, columns=["a", "b", "c", "d"])
+    categorical = pd.DataFrame(rng.integers(0, 3, (600, 3)).astype(str), columns=["u", "v", "w"])
+    categorical["v"] = categorical["u"] + "!"
+    categorical.loc[500:, "w"] = "new" # a level that appears late
+    for data in (numeric, categorical):
+        chunks = [data.iloc[i:i+100] for i in range(0, 600, 100)]
+        tracker = correlation_module.CorrelationTracker()
+        for chunk in chunks[:3]:
+            tracker.add(chunk)
+        for k in range(3, 6):
+            tracker.remove(chunks[k-3]).add(chunks[k])
+            assert np.allclose(tracker.correlation(), correlation(pd.concat(chunks[k-2:k+1])))
+        assert tracker.n == 300
+        with pytest.raises(ValueError): # more rows than the window has
+            tracker.remove(data)
+        assert tracker.n == 300
+    with pytest.raises(ValueError):
+        correlation_module.CorrelationTracker().remove(numeric)
+    with pytest.raises(ValueError): # the value "new" is in the window only once per row of chunks[5]
+        tracker.remove(pd.concat([chunks[5], chunks[5]]))
+    assert tracker.n == 300
+    
+    chunks = [numeric.iloc[i:i+100].copy() for i in range(0, 300, 100)]
+    chunks[0].iloc[5, 0] = np.nan
+    tracker = correlation_module.CorrelationTracker()
+    with pytest.raises(ValueError): # a NaN would stay in the co-moments after its chunk is removed
+        tracker.add(chunks[0])
+    for chunk in chunks[1:]:
+        tracker.add(chunk)
+    assert np.allclose(tracker.correlation(), correlation(pd.concat(chunks[1:])))
+    with pytest.raises(ValueError):
+        tracker.remove(chunks[0])
+    assert np.allclose(tracker.remove(chunks[1]).correlation(), correlation(chunks[2]))
+
+def test_caching(tmp_path):
+    """Checks that the cached functions give the same results as the original ones and only calculate the pairs of the changed columns"""
+    rng = np.random.default_rng(0)
+    numeric = pd.DataFrame(rng.standard_normal((500, 4)), columns=["a", "b", "c", "d"])
+    categorical = pd.DataFrame(rng.integers(0, 4, (500, 3)).astype(str), columns=["u", "v", "w"])
+    cache = caching.ResultCache()
+    for data in (numeric, categorical):
+        assert np.allclose(caching.cached_correlation(data, cache=cache), correlation(data))
+        assert np.allclose(caching.cached_calc_metrics(data, cache=cache), metrics.calc_metrics(data))
+    cut, cut_pts = caching.cached_discretize(numeric, 3, "EF", cache=cache)
+    expected, expected_pts = discretization.discretize(numeric, 3, "EF")
+    assert cut.equals(expected) and all(np.array_equal(p, q) for p, q in zip(cut_pts, expected_pts))
+
+    changed = numeric.copy()
+    changed["d"] = changed["d"]*2 + changed["a"] # only the column d changes
+    misses = cache.misses
+    assert np.allclose(caching.cached_correlation(changed, cache=cache), correlation(changed))
+    assert cache.misses - misses == 2 # the correlations and the norm of d
+    assert caching.column_hash(changed["a"]) == caching.column_hash(numeric["a"].to_numpy())
+
+    changed = categorical.copy()
+    changed["v"] = changed["v"] + "!" # the partial path of the mutual information
+    changed["w"] = changed["u"] # identical columns
+    assert np.allclose(caching.cached_correlation(changed, cache=cache), correlation(changed))
+    assert np.allclose(caching.cached_correlation(changed, cache=cache), correlation(changed))
+
+    disk = caching.ResultCache(max_items=2, directory=tmp_path, max_bytes=1000)
+    for i in range(50):
+        disk.set(f"key{i}", np.arange(10.0))
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 1000
+    assert np.array_equal(caching.ResultCache(directory=tmp_path).get("key49"), np.arange(10.0))
+    assert disk.get("key0") is None
+
+def test_discretize_mixed_types():
+    """Checks that the columns with pandas extension types are discretized if they are numeric and returned unchanged otherwise"""
+    data = pd.DataFrame({"f": [1., 2, 3, 4, 5, 6], "c": pd.Categorical(list("abcabc")), "i": pd.array([1, 2, None, 4, 5, 6], dtype="Int64"),
+                         "s": pd.array(list("xyzxyz"), dtype="string"), "b": [True, False]*3})
+    for disc_alg in ("EW", "EF"):
+        for result in (discretization.discretize(data, 2, disc_alg)[0], discretization._discretizer_classes[disc_alg](2).fit_transform(data),
+                       caching.cached_discretize(data, 2, disc_alg, cache=caching.ResultCache())[0]):
+            assert result["f"].dtype == "category" and result["i"].dtype == "category"
+            for name in ("c", "s", "b"):
+                assert result[name].equals(data[name])
+
+def test_nullable_numeric():
+    """Checks that nullable numeric columns with missing values give the same results as float columns with NaN"""
+    data = pd.DataFrame({"a": pd.array([1., 2, None, 4, 5], dtype="Float64"), "b": pd.array([2., 1, 3, 5, 4], dtype="Float64"), "c": [1., 3, 2, 5, 4]})
+    floats = data.astype(float)
+    assert correlation(data).equals(correlation(floats))
+    for operation in ("normalize", "satandarize"):
+        assert feature_scaling(data, operation).equals(feature_scaling(floats, operation))
+    # the missing value is skipped, like the baseline did through pandas
+    assert np.allclose(feature_scaling(floats, "normalize")["a"], [0, .25, np.nan, .75, 1], equal_nan=True)
+    expected = (floats["a"]-floats["a"].mean())/floats["a"].std(ddof=0)
+    assert np.allclose(feature_scaling(floats, "satandarize")["a"], expected, equal_nan=True)
+    scaler = feature_scaling_module.StandardScaler()
+    for start in range(0, 5, 2): # the chunk [None, 4] has a single value in "a"
+        scaler.partial_fit(data.iloc[start:start+2])
+    assert scaler.n_.tolist() == [4, 5, 5]
+    assert np.allclose(scaler.var_, floats.var(ddof=0))
+    assert np.allclose(scaler.var_, feature_scaling_module.StandardScaler().fit(data).var_)
+    scaler = feature_scaling_module.MinMaxScaler()
+    for start in range(0, 5, 2):
+        scaler.partial_fit(data.iloc[start:start+2])
+    assert scaler.min_.tolist() == [1, 1, 1] and scaler.max_.tolist() == [5, 5, 5]
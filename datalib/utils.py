@@ -1,32 +1,159 @@
 import numpy as np
 import pandas as pd
+import os
+import queue
+import threading
+import weakref
+from datalib import profiling
 
-def data2df(data):
+@profiling.instrument
+def data2df(data, copy=False):
     """This function gets a vector or matrix and returns it in pandas Dataframe format.
     If the input data is already in pandas Dataframe format the output will be the same as the input.
+    
+    Numpy arrays (including memory-mapped ones) and Arrow tables are wrapped without copying their values. The columns built from a numpy array are 
+    read-only views of it, so a function that needs to modify the data must ask for a copy.
 
     Parameters
     ----------
-    data (list, numpy.array or pandas.DataFrame): The data whose format is going to be changed.
+    data (list, numpy.array, pyarrow.Table, str or pandas.DataFrame): The data whose format is going to be changed. A string is read as the path of a 
+        .npy file, which is memory-mapped instead of loaded.
+    copy (bool): If True the result owns a writable copy of the values. By default False.
 
     Returns
     -------
     pd.DataFrame : Input data in pandas Dataframe format
     """
     
-    if not isinstance(data, pd.DataFrame):
-        if len(np.array(data).shape)==1:
-            return(pd.DataFrame(data,columns=["Var 1"]))
-        elif len(np.array(data).shape)==2:
-            names= [f"Var {i+1}" for i in range(len(data[0]))]
-            return(pd.DataFrame(data, columns=names))
-        else:
-            print("Something is wrong with the input. Check that it is in one of the following formats:\n -Vector (List or numpy array)\n -Matrix (List or numpy array)\n -Pandas DataFrame")
-    else:
+    if isinstance(data, pd.DataFrame):
+        profiling.note_path("dataframe")
+        if copy:
+            profiling.note_copy(data.memory_usage(index=False).sum())
+            return(data.copy())
         return(data)
     
+    if isinstance(data, (str, os.PathLike)) and str(data).endswith(".npy"):
+        profiling.note_path("memmap")
+        data = np.load(data, mmap_mode="r")
+    elif hasattr(data, "to_pandas") and hasattr(data, "schema"): # pyarrow.Table or pyarrow.RecordBatch
+        profiling.note_path("arrow")
+        data_new = data.to_pandas(split_blocks=True) # one block per column, numeric columns without nulls are not copied
+        return(data_new.copy() if copy else data_new)
+    
+    profiling.note_path("converted")
+    if isinstance(data, np.ndarray):
+        values = data.view() # a view, so the flags of the input are not changed
+        values.flags.writeable = False
+    else:
+        values = data # lists keep their own type per column, as numpy would convert them all to a common one
+    ndim = np.ndim(values)
+    if ndim == 1:
+        data_new = pd.DataFrame(values.reshape(-1, 1) if isinstance(values, np.ndarray) else values, columns=["Var 1"], copy=False)
+    elif ndim == 2:
+        names = [f"Var {i+1}" for i in range(len(values[0]))]
+        data_new = pd.DataFrame(values, columns=names, copy=False)
+    else:
+        print("Something is wrong with the input. Check that it is in one of the following formats:\n -Vector (List or numpy array)\n -Matrix (List or numpy array)\n -Pandas DataFrame")
+        return(None)
+    if copy:
+        profiling.note_copy(data_new.memory_usage(index=False).sum())
+        return(data_new.copy())
+    return(data_new)
+    
+CONTINUOUS = "continuous"
+DISCRETE = "discrete"
+BOOLEAN = "boolean"
+CATEGORICAL = "categorical"
+
+_schema_cache = {}
+
+def column_kind(dtype):
+    """This function classifies a column type as continuous (any float), discrete (any integer), boolean or categorical (the rest: strings, objects, 
+    categories, dates...). The width of the type and the nullable pandas types do not matter, so float32 and Float64 are continuous like float64.
+
+    Parameters
+    ----------
+    dtype (numpy.dtype or pandas extension type): The type of the column.
+
+    Returns
+    -------
+    str : One of CONTINUOUS, DISCRETE, BOOLEAN or CATEGORICAL.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        return(BOOLEAN)
+    elif pd.api.types.is_float_dtype(dtype):
+        return(CONTINUOUS)
+    elif pd.api.types.is_integer_dtype(dtype):
+        return(DISCRETE)
+    return(CATEGORICAL)
+
+def is_numeric_kind(dtype):
+    """This function checks if a column type is continuous or discrete (see column_kind), including the nullable pandas types. Booleans are not numeric.
+
+    Parameters
+    ----------
+    dtype (numpy.dtype or pandas extension type): The type of the column.
+
+    Returns
+    -------
+    bool : True if the type is numeric.
+    """
+    return(column_kind(dtype) in (CONTINUOUS, DISCRETE))
+
+def numeric_values(data, dtype=None):
+    """This function returns the values of a numeric column or dataframe as a numpy array. The nullable pandas types (Int64, Float64...) are converted
+    to float, or to dtype, with NaN for the missing values, as numpy has no pd.NA.
+
+    Parameters
+    ----------
+    data (pandas.Series or pandas.DataFrame): Numeric data.
+    dtype (str or numpy.dtype, optional): Type of the result. By default the type of the data (float for nullable types).
+
+    Returns
+    -------
+    numpy.array : The values, without copies when the type does not change.
+    """
+    dtypes = data.dtypes if isinstance(data, pd.DataFrame) else [data.dtype]
+    if all(isinstance(column_dtype, np.dtype) for column_dtype in dtypes):
+        return(data.to_numpy(dtype=dtype))
+    return(data.to_numpy(dtype=dtype or float, na_value=np.nan))
+
+def infer_schema(data):
+    """This function classifies every column of the data with column_kind.
+    
+    The schema of a dataframe is cached while the dataframe exists, and it is only calculated again if its columns or their types change, so the functions 
+    that dispatch on the type of the data can call it repeatedly.
+
+    Parameters
+    ----------
+    data (pandas.DataFrame or pandas.Series): The data whose columns are going to be classified.
+
+    Returns
+    -------
+    pd.Series : The kind of each column, indexed by the column names.
+    """
+    if isinstance(data, pd.Series):
+        return(pd.Series([column_kind(data.dtype)], index=[data.name], name="Kind"))
+    
+    dtypes = tuple(data.dtypes)
+    key = id(data)
+    entry = _schema_cache.get(key)
+    if entry is not None and entry[0]() is data and entry[1] is data.columns and entry[2] == dtypes:
+        return(entry[3])
+    
+    kinds = {dtype: column_kind(dtype) for dtype in set(dtypes)} # usually a few distinct types for many columns
+    schema = pd.Series([kinds[dtype] for dtype in dtypes], index=data.columns, name="Kind", dtype=object)
+    try:
+        ref = weakref.ref(data, lambda ref: _schema_cache.get(key, (None,))[0] is ref and _schema_cache.pop(key, None))
+    except TypeError: # objects that do not support weak references are not cached
+        return(schema)
+    _schema_cache[key] = (ref, data.columns, dtypes, schema)
+    return(schema)
+
 def is_num(data):
     """This function checks if the input data is numeric. Returns True if it is and False if it is not.
+    
+    The data is numeric if all the columns are continuous or all of them are discrete (see infer_schema), of any width.
 
     Parameters
     ----------
@@ -36,7 +163,8 @@ def is_num(data):
     -------
     bool : True if input is numeric, False if not.
     """
-    if all(data.dtypes == 'float64') or all(data.dtypes == 'int64'):
+    kinds = set(infer_schema(data))
+    if kinds == {CONTINUOUS} or kinds == {DISCRETE}:
         return(True)
     else:
         return(False)
@@ -52,7 +180,103 @@ def is_cont(data):
     -------
     bool : True if input is continuous, False if it is discrete.
     """
-    if all(data.dtypes == 'float64'):
+    if isinstance(data, pd.Categorical) or isinstance(data, str):
+        return(False)
+    kinds = set(infer_schema(data))
+    if kinds <= {CONTINUOUS}:
         return(True)
-    elif isinstance(data, pd.Categorical) or isinstance(data, str) or all(data.dtypes == 'int64'):
-        return(False)
\ No newline at end of file
+    elif kinds == {DISCRETE}:
+        return(False)
+
+def factorize(x):
+    """
+    Encodes a vector as integer codes, one per distinct value. Missing values get the code -1, like the codes of a pandas.Categorical, so they are 
+    left out of the counts.
+    
+    Parameters
+    ----------
+    x (list, np.array, pandas.Series or pandas.Categorical): Vector of values.
+    
+    Returns
+    -------
+    codes (np.array): Integer code of each value, between 0 and n_levels-1, or -1 for the missing values.
+    n_levels (int): Number of distinct values, without the missing values.
+    """
+    codes, uniques = pd.factorize(x if isinstance(x, (pd.Series, pd.Categorical)) else np.asarray(x))
+    return(codes.astype(np.intp, copy=False), len(uniques))
+
+def iter_chunks(source, chunksize=100000):
+    """This function reads data by chunks, so it can be processed without loading it all in memory.
+
+    Parameters
+    ----------
+    source (str, pandas.DataFrame or iterable): The data to read. There are three options:
+                    -Path of a CSV file, or of a Parquet file if the extension is .parquet or .pq (requires pyarrow).
+                    -A dataframe, which will be split in chunks.
+                    -An iterable of chunks (lists, numpy arrays or dataframes), for example pandas.read_csv(path, chunksize=...).
+    chunksize (int): Number of rows of each chunk, when source is a file or a dataframe. By default 100000.
+
+    Returns
+    -------
+    generator : The chunks as pandas Dataframes.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        if str(source).endswith((".parquet", ".pq")):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet files requires pyarrow. Install it with: pip install pyarrow")
+            for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+                yield(batch.to_pandas())
+        else:
+            yield from pd.read_csv(source, chunksize=chunksize)
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield(source.iloc[start:start+chunksize])
+    else:
+        for chunk in source:
+            yield(data2df(chunk))
+
+def prefetch(iterable, size=2):
+    """This function reads the next items of an iterable in a background thread while the current one is being processed, so reading overlaps with computing.
+
+    Parameters
+    ----------
+    iterable (iterable): Items to read, for example the chunks of iter_chunks.
+    size (int): Maximum number of items read in advance. By default 2.
+
+    Returns
+    -------
+    generator : The same items, in the same order.
+    """
+    buffer = queue.Queue(maxsize=size)
+    done = object()
+    stop = threading.Event()
+    
+    def reader():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        except BaseException as error: # raised again in the consumer
+            buffer.put(error)
+        buffer.put(done)
+    
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield(item)
+    finally:
+        stop.set()